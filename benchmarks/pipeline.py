@@ -0,0 +1,240 @@
+"""
+Benchmarks of the simulation pipeline, stage by stage, on synthetic puzzles.
+
+Run from the repository root (the kernel submodule must be checked out):
+
+    PYTHONPATH=. uv run python benchmarks/pipeline.py                        # print timings
+    PYTHONPATH=. uv run python benchmarks/pipeline.py --save baseline.json   # store a baseline
+    PYTHONPATH=. uv run python benchmarks/pipeline.py --compare baseline.json
+
+With `--compare`, the exit status is 1 if any stage got slower (or used more memory) than its baseline by more than
+`--tolerance`. Baselines are only comparable on the same machine.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from kernel.engine.driver import run_true_experiment
+from web import caching
+from web.cache_warming import default_requests
+from web.log_utils import job_diagnostics
+from web.mechanisms import NUM_REACTANT_SLOTS
+from web.puzzle_registry import PuzzleEntry
+from web.run_simulation import (
+    align_trajectories,
+    draw_plots,
+    make_condition,
+    make_puzzle,
+    make_solution,
+    prune_proposal,
+    run_user_model,
+    score_aligned,
+    true_data_cache,
+)
+
+# (species, reactions), up to the limits enforced by `web.save_a_puzzle`.
+SIZES = [(5, 5), (10, 10), (25, 25), (50, 50)]
+# How far apart species energies are spread. The wider the spread, the more widely separated the rate constants, and
+# the stiffer the system.
+ENERGY_SPREADS = {"nonstiff": 10.0, "stiff": 200.0}
+JOB_ID = "benchmark"
+
+
+def make_synthetic_puzzle(
+    num_species: int, num_reactions: int, energy_spread: float, seed: int = 0
+) -> PuzzleEntry:
+    """A random but reproducible puzzle, with elementary reactions of at most 2 reactants and 2 products."""
+    rng = random.Random(seed)
+    species_list = [f"S{i}" for i in range(num_species)]
+    coefficient_array = []
+    while len(coefficient_array) < num_reactions:
+        row = [0] * num_species
+        for sign in (1, -1):
+            for species in rng.sample(
+                range(num_species), rng.randint(1, NUM_REACTANT_SLOTS)
+            ):
+                row[species] += sign
+        if any(row) and row not in coefficient_array:
+            coefficient_array.append(row)
+    reagents = species_list[:2]
+    return PuzzleEntry.from_definition(
+        f"synthetic-{num_species}x{num_reactions}-{energy_spread:g}",
+        {
+            "coefficient_dict": {name: i for i, name in enumerate(species_list)},
+            "energy_dict": {
+                name: round(rng.uniform(0, energy_spread), 3) for name in species_list
+            },
+            "coefficient_array": coefficient_array,
+            "reagents": reagents,
+            "reagentPERs": {
+                reagent: [rng.random() < 0.5 for _ in coefficient_array]
+                for reagent in reagents
+            },
+        },
+    )
+
+
+def set_up_puzzle(puzzle: PuzzleEntry, data: Dict, state: Dict):
+    state["puzzle"] = make_puzzle(JOB_ID, puzzle)
+    state["condition"] = make_condition(
+        JOB_ID, puzzle.species_list, data["temperature"], data["conditions"]
+    )
+
+
+def simulate_true_model(puzzle: PuzzleEntry, data: Dict, state: Dict):
+    # The driver pre-equilibrates the reagents first, so this stage includes pre-equilibration.
+    state["true_data"] = run_true_experiment(
+        JOB_ID, state["puzzle"], state["condition"], diag=False
+    )
+
+
+def prepare_solution(puzzle: PuzzleEntry, data: Dict, state: Dict):
+    state["species_list"], reactions = prune_proposal(
+        JOB_ID, puzzle, data["reactions"], data["conditions"]
+    )
+    state["solution"] = make_solution(JOB_ID, puzzle, reactions, state["species_list"])
+
+
+def simulate_user_model(puzzle: PuzzleEntry, data: Dict, state: Dict):
+    state["user_data"] = run_user_model(
+        JOB_ID,
+        puzzle,
+        state["species_list"],
+        state["solution"],
+        data["temperature"],
+        data["conditions"],
+        state["true_data"],
+    )
+
+
+def align(puzzle: PuzzleEntry, data: Dict, state: Dict):
+    state["aligned"] = align_trajectories(state["true_data"], state["user_data"])
+
+
+def score(puzzle: PuzzleEntry, data: Dict, state: Dict):
+    # On the aligned trajectories, so that alignment (which `score_user_answer` includes) is only counted once.
+    score_aligned(*state["aligned"])
+
+
+def plot(puzzle: PuzzleEntry, data: Dict, state: Dict):
+    draw_plots(JOB_ID, puzzle, state["true_data"], state["user_data"])
+
+
+# The stages of a `/plot` job, in order. Each one reads what the previous ones left in `state`.
+STAGES: List[Tuple[str, Callable[[PuzzleEntry, Dict, Dict], None]]] = [
+    ("puzzle setup", set_up_puzzle),
+    ("true model", simulate_true_model),
+    ("solution", prepare_solution),
+    ("user model", simulate_user_model),
+    ("alignment", align),
+    ("scoring", score),
+    ("plotting", plot),
+]
+
+
+def clear_caches():
+    """Make every run pay the full cost, as the first player of a puzzle would."""
+    caching.shared_backend = None
+    true_data_cache.local.clear()
+
+
+def measure(puzzle: PuzzleEntry, repeat: int, diagnostics: bool) -> Dict[str, Dict]:
+    """The median duration (in seconds) and peak memory (in bytes) of each stage."""
+    # The proposal is the true mechanism, as with a player who solved the puzzle.
+    data = default_requests(puzzle)[1]
+    durations: Dict[str, List[float]] = {}
+    with job_diagnostics(JOB_ID, diagnostics):
+        for _ in range(repeat):
+            clear_caches()
+            state: Dict = {}
+            for name, run in STAGES:
+                start = time.perf_counter()
+                run(puzzle, data, state)
+                durations.setdefault(name, []).append(time.perf_counter() - start)
+        # Tracing allocations slows everything down, so peak memory is measured in a separate run.
+        clear_caches()
+        state = {}
+        peaks = {}
+        tracemalloc.start()
+        for name, run in STAGES:
+            tracemalloc.reset_peak()
+            run(puzzle, data, state)
+            peaks[name] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {
+        name: {"seconds": statistics.median(times), "peak_bytes": peaks[name]}
+        for name, times in durations.items()
+    }
+
+
+def run_benchmarks(repeat: int) -> Dict[str, Dict]:
+    results = {}
+    for kind, energy_spread in ENERGY_SPREADS.items():
+        for num_species, num_reactions in SIZES:
+            puzzle = make_synthetic_puzzle(num_species, num_reactions, energy_spread)
+            for diagnostics in (False, True):
+                case = f"{kind}-{num_species}x{num_reactions}" + (
+                    "-diagnostics" if diagnostics else ""
+                )
+                results[case] = measure(puzzle, repeat, diagnostics)
+                print_case(case, results[case])
+    return results
+
+
+def print_case(case: str, stages: Dict[str, Dict]):
+    print(case)
+    for name, result in stages.items():
+        print(
+            f"    {name:<20}{result['seconds'] * 1000:>10.1f} ms"
+            f"{result['peak_bytes'] / 2**20:>10.1f} MiB"
+        )
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Describe every stage that regressed by more than `tolerance` (a fraction) from its baseline."""
+    regressions = []
+    for case, stages in results.items():
+        for name, result in stages.items():
+            before = baseline.get(case, {}).get(name)
+            if before is None:
+                continue
+            for metric in ("seconds", "peak_bytes"):
+                if result[metric] > before[metric] * (1 + tolerance):
+                    regressions.append(
+                        f"{case} / {name}: {metric} went from"
+                        f" {before[metric]:.4g} to {result[metric]:.4g}."
+                    )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", metavar="PATH", help="Store the results here.")
+    parser.add_argument("--compare", metavar="PATH", help="Compare with a baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    np.seterr(all="warn")
+    results = run_benchmarks(args.repeat)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=4)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION:", regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from web.puzzle_registry import PuzzleEntry
+
+# A -> B, with A as the only reagent, not pre-equilibrated.
+TOY_PUZZLE = {
+    "coefficient_array": [[1, -1]],
+    "energy_dict": {"A": 10.0, "B": 20.0},
+    "coefficient_dict": {"A": 0, "B": 1},
+    "reagentPERs": {"A": [False]},
+}
+# What the fake kernel returns for every simulation: time, then the amounts of A and B.
+TOY_TRUE_DATA = np.array([[0.0, 1.0], [1.0, 0.5], [0.0, 0.5]])
+
+
+@pytest.fixture()
+def toy_puzzle():
+    return PuzzleEntry.from_definition("toy", TOY_PUZZLE)
+
+
+@pytest.fixture()
+def fake_kernel(monkeypatch):
+    """
+    Replace the kernel's simulations, plots and scoring with fakes, recording the arguments of each simulation.
+
+    Both models always follow `TOY_TRUE_DATA`, restricted to the species the proposed model keeps, and score 100.
+    """
+    # Imported here, so that the tests that never simulate anything run without the kernel.
+    from web.run_simulation import true_data_cache
+
+    runs = SimpleNamespace(true=[], proposed=[])
+
+    def fake_run_true_experiment(*args, **kwargs):
+        runs.true.append(args)
+        return TOY_TRUE_DATA
+
+    def fake_run_proposed_experiment(job_id, condition, solution, true_data, **kwargs):
+        runs.proposed.append((job_id, condition, solution, true_data))
+        return true_data
+
+    monkeypatch.setattr(
+        "web.run_simulation.run_true_experiment", fake_run_true_experiment
+    )
+    monkeypatch.setattr(
+        "web.run_simulation.run_proposed_experiment", fake_run_proposed_experiment
+    )
+    monkeypatch.setattr(
+        "web.run_simulation.plotter.sub_plots",
+        lambda **kwargs: ("<svg>individual</svg>", "<svg>combined</svg>"),
+    )
+    monkeypatch.setattr("web.run_simulation.score_user_answer", lambda *args: 100.0)
+    # Tests sharing a puzzle definition, temperature and conditions would otherwise reuse each other's simulations.
+    true_data_cache.local.clear()
+    return runs
+
+
+@pytest.fixture()
+def client(tmp_path, monkeypatch):
+    from web.main import app, limiter
+
+    # Redirect puzzles directory to a temp path for isolation
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "puzzles").mkdir()
+    app.config["TESTING"] = True
+    # Disable rate limiting for the tests to avoid hitting 5/min limit
+    try:
+        limiter.enabled = False  # type: ignore[attr-defined]
+    except Exception:
+        app.config["RATELIMIT_ENABLED"] = False
+    with app.test_client() as c:
+        yield c
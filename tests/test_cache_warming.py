@@ -0,0 +1,70 @@
+import json
+from concurrent.futures import Future
+
+from web.cache_warming import CacheWarmer, default_conditions, default_requests
+from web.mechanisms import mechanism_fingerprint
+from web.puzzle_registry import PuzzleEntry, PuzzleRegistry
+
+DEFINITION = {
+    # A + B -> C, with reactants negative, as `web.save_a_puzzle` stores it.
+    "coefficient_array": [[-1, -1, 1]],
+    "energy_dict": {"A": 10.0, "B": 20.0, "C": 5.0},
+    "coefficient_dict": {"A": 0, "B": 1, "C": 2},
+    "reagentPERs": {"B": [False], "A": [False]},
+}
+
+
+def make_registry(tmp_path):
+    (tmp_path / "warm.json").write_text(json.dumps(DEFINITION))
+    return PuzzleRegistry(str(tmp_path))
+
+
+def finished(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def test_default_conditions_follow_the_order_of_species():
+    puzzle = PuzzleEntry.from_definition("warm", DEFINITION)
+    assert [each["name"] for each in default_conditions(puzzle)] == ["A", "B"]
+
+
+def test_default_requests_include_the_true_mechanism():
+    puzzle = PuzzleEntry.from_definition("warm", DEFINITION)
+    empty, true = default_requests(puzzle)
+    assert empty["reactions"] == []
+    assert mechanism_fingerprint(
+        true["reactions"], puzzle.species_list
+    ) == mechanism_fingerprint([["A", "B", "C", ""]], puzzle.species_list)
+
+
+def test_warm_skips_requests_already_warm(tmp_path):
+    submitted = []
+
+    def submit(data):
+        submitted.append(data)
+        return finished({"status": "success"})
+
+    warmer = CacheWarmer(
+        make_registry(tmp_path),
+        submit=submit,
+        is_warm=lambda data: data["reactions"] == [],
+        is_idle=lambda: True,
+    )
+    warmer.warm()
+    assert len(submitted) == 1
+    assert warmer.progress == {"total": 2, "warmed": 1, "skipped": 1, "failed": 0}
+
+
+def test_warm_waits_for_the_queue_to_be_idle(tmp_path):
+    idle = iter([False, False, True, True])
+    warmer = CacheWarmer(
+        make_registry(tmp_path),
+        submit=lambda data: finished({"status": "error"}),
+        is_warm=lambda data: False,
+        is_idle=lambda: next(idle),
+        poll_interval=0,
+    )
+    warmer.warm(["warm"])
+    assert warmer.progress["failed"] == 2
@@ -0,0 +1,51 @@
+import numpy as np
+
+from web import caching
+from web.caching import (
+    BytesLRUCache,
+    LRUCache,
+    TieredCache,
+    decode_array,
+    encode_array,
+)
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "a" in cache
+    assert "b" not in cache
+    assert len(cache) == 2
+
+
+def test_array_round_trip():
+    array = np.linspace(0, 1, 12).reshape(3, 4)
+    np.testing.assert_array_equal(decode_array(encode_array(array)), array)
+
+
+def test_tiered_cache_returns_independent_copies(monkeypatch):
+    monkeypatch.setattr(caching, "shared_backend", None)
+    cache = TieredCache("test", encode=encode_array, decode=decode_array)
+    assert cache.get("key") is None
+    cache.set("key", np.zeros(3))
+    first = cache.get("key")
+    first[0] = 1.0
+    np.testing.assert_array_equal(cache.get("key"), np.zeros(3))
+    assert cache.stats == {"local_hits": 2, "shared_hits": 0, "misses": 1}
+
+
+def test_bytes_lru_cache_evicts_by_size():
+    cache = BytesLRUCache(max_bytes=10)
+    cache.set("a", b"1234")
+    cache.set("b", b"5678")
+    cache.get("a")
+    cache.set("c", b"90")
+    assert cache.size == 10
+    cache.set("d", b"x")
+    assert "b" not in cache
+    assert "a" in cache
+    cache.set("huge", b"x" * 11)
+    assert "huge" not in cache
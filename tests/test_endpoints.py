@@ -0,0 +1,207 @@
+import json
+from concurrent.futures import Future
+
+import pytest
+
+from tests.conftest import TOY_PUZZLE
+from web import main
+
+CONDITIONS = [{"name": "A", "amount": 1.0, "temperature": 273.15}]
+
+
+@pytest.fixture()
+def puzzle_client(client, fake_kernel):
+    """A client for an app that only knows the toy puzzle, and has neither cached nor run anything yet."""
+    with open("puzzles/toy.json", "w") as f:
+        json.dump(TOY_PUZZLE, f)
+    main.result_store.local.clear()
+    main.cache.clear()
+    return client
+
+
+@pytest.fixture()
+def submitted(monkeypatch):
+    """Run jobs right away, in this process, instead of on the worker pool. Records their job IDs."""
+    job_ids = []
+
+    def submit(job_id, fn, *args, on_done=None):
+        job_ids.append(job_id)
+        future = Future()
+        future.set_result(fn(*args))
+        if on_done is not None:
+            on_done(future)
+        return future
+
+    def submit_all(job_id, fn, args_list, combine, on_done=None):
+        results = []
+        for i, args in enumerate(args_list):
+            job_ids.append(f"{job_id}/{i}")
+            results.append(fn(*args))
+        future = Future()
+        future.set_result(combine(results))
+        if on_done is not None:
+            on_done(future)
+        return future
+
+    monkeypatch.setattr(main.job_queue, "submit", submit)
+    monkeypatch.setattr(main.job_queue, "submit_all", submit_all)
+    return job_ids
+
+
+def request_data(job_id, **fields):
+    return {
+        "jobID": job_id,
+        "puzzle": "toy",
+        "temperature": 300.0,
+        "conditions": CONDITIONS,
+        "reactions": [["A", "", "B", ""]],
+        **fields,
+    }
+
+
+def test_batch_scores_every_mechanism(puzzle_client, submitted):
+    r = puzzle_client.post(
+        "/batch",
+        json=request_data(
+            "batch", mechanisms=[[["A", "", "B", ""]], [["B", "", "A", ""]]]
+        ),
+    )
+    result = r.get_json()
+    assert r.status_code == 200
+    assert result["status"] == "success"
+    assert result["jobID"] == "batch"
+    assert [each["score"] for each in result["results"]] == [100.0, 100.0]
+    assert "timings" not in result
+
+
+def test_large_batches_are_split_into_parallel_parts(
+    puzzle_client, submitted, monkeypatch
+):
+    monkeypatch.setattr(main, "BATCH_PART_SIZE", 2)
+    monkeypatch.setattr(main.job_queue, "max_workers", 4)
+    mechanisms = [[["A", "", "B", ""]], [["B", "", "A", ""]], [], [["A", "", "B", ""]]]
+    r = puzzle_client.post("/batch", json=request_data("big", mechanisms=mechanisms))
+    result = r.get_json()
+    assert submitted == ["big/0", "big/1"]
+    assert result["status"] == "success"
+    assert len(result["results"]) == 4
+    assert "timings" not in result
+
+
+@pytest.mark.parametrize(
+    "mechanisms", [None, [], [[["A", "", "B", ""]]] * (main.MAX_BATCH_SIZE + 1)]
+)
+def test_batch_rejects_bad_mechanisms(puzzle_client, submitted, mechanisms):
+    r = puzzle_client.post("/batch", json=request_data("batch", mechanisms=mechanisms))
+    assert r.status_code == 400
+    assert submitted == []
+
+
+def test_plot_reports_an_error_for_a_corrupt_puzzle_file(puzzle_client, submitted):
+    with open("puzzles/Corrupt.json", "w") as f:
+        f.write('{"energy_dict": {')
+    r = puzzle_client.post("/plot", json=request_data("corrupt", puzzle="Corrupt"))
+    assert r.status_code == 200
+    assert r.get_json() == {"jobID": "corrupt", "status": "error"}
+
+
+def test_async_job_result_is_served_from_result(puzzle_client, submitted):
+    r = puzzle_client.post(
+        "/batch",
+        json=request_data(
+            "async", mechanisms=[[["A", "", "B", ""]]], **{"async": True}
+        ),
+    )
+    assert r.status_code == 202
+    assert r.get_json() == {"jobID": "async", "status": "queued"}
+    r = puzzle_client.get("/result/async")
+    assert r.status_code == 200
+    assert r.get_json()["results"][0]["score"] == 100.0
+    assert puzzle_client.get("/result/unknown").status_code == 404
+
+
+def test_render_reuses_the_trajectories_of_a_score_only_job(
+    puzzle_client, submitted, fake_kernel
+):
+    scored = puzzle_client.post("/plot", json=request_data("score", mode="score"))
+    assert scored.get_json()["score"] == 100.0
+    assert "arrays" not in scored.get_json()
+    rendered = puzzle_client.post("/render", json=request_data("render"))
+    result = rendered.get_json()
+    assert submitted == ["score", "render"]
+    assert len(fake_kernel.true) == len(fake_kernel.proposed) == 1
+    assert result["status"] == "success"
+    assert result["plot_combined"] == "<svg>combined</svg>"
+    assert result["score"] == 100.0
+
+
+def test_sweep_is_served_from_the_result_store_once_done(
+    puzzle_client, submitted, monkeypatch
+):
+    monkeypatch.setattr(main.job_queue, "max_workers", 1)
+    sweep = [{"temperature": 280.0}, {"temperature": 300.0}]
+    first = puzzle_client.post(
+        "/sweep", json=request_data("first", sweep=sweep, plot=False)
+    )
+    second = puzzle_client.post(
+        "/sweep", json=request_data("second", sweep=sweep, plot=False)
+    )
+    assert submitted == ["first"]
+    assert second.get_json() == {**first.get_json(), "jobID": "second"}
+    assert [each["temperature"] for each in second.get_json()["results"]] == [
+        280.0,
+        300.0,
+    ]
+
+
+def test_sweep_experiments_run_in_parallel_parts(puzzle_client, submitted, monkeypatch):
+    monkeypatch.setattr(main.job_queue, "max_workers", 2)
+    sweep = [{"temperature": 300.0}, {"temperature": 280.0}, {"temperature": 290.0}]
+    r = puzzle_client.post("/sweep", json=request_data("sweep", sweep=sweep))
+    result = r.get_json()
+    assert submitted == ["sweep/0", "sweep/1"]
+    assert [each["temperature"] for each in result["results"]] == [
+        300.0,
+        280.0,
+        290.0,
+    ]
+    assert result["plot_sweep"].startswith("<?xml")
+
+
+def test_sweep_rejects_experiments_that_are_not_objects(puzzle_client, submitted):
+    r = puzzle_client.post("/sweep", json=request_data("sweep", sweep=[280.0]))
+    assert r.status_code == 400
+    assert submitted == []
+
+
+def test_identical_jobs_follow_the_running_one(puzzle_client, monkeypatch):
+    pending = []
+
+    def submit(job_id, fn, *args, on_done=None):
+        pending.append((fn, args, on_done))
+        return Future()
+
+    monkeypatch.setattr(main.job_queue, "submit", submit)
+    sweep = [{"temperature": 280.0}]
+    for job_id in ("leader", "follower"):
+        r = puzzle_client.post(
+            "/sweep",
+            json=request_data(job_id, sweep=sweep, plot=False, **{"async": True}),
+        )
+        assert r.status_code == 202
+    assert len(pending) == 1
+    assert puzzle_client.get("/result/follower").status_code == 202
+    fn, args, on_done = pending[0]
+    future = Future()
+    future.set_result(fn(*args))
+    on_done(future)
+    leader = puzzle_client.get("/result/leader").get_json()
+    follower = puzzle_client.get("/result/follower").get_json()
+    assert follower["status"] == "success"
+    assert follower == {**leader, "jobID": "follower"}
+    # The leader has released its key, so the next identical job is served from the result store.
+    r = puzzle_client.post(
+        "/sweep", json=request_data("latecomer", sweep=sweep, plot=False)
+    )
+    assert r.get_json() == {**leader, "jobID": "latecomer"}
+    assert len(pending) == 1
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from web.job_queue import JobQueue, QueueFullError, default_max_workers
+
+
+@pytest.fixture
+def job_queue():
+    queue = JobQueue(max_workers=1, max_depth=1)
+    yield queue
+    queue.shutdown()
+
+
+def test_submit_runs_job_in_worker_process(job_queue):
+    future = job_queue.submit("job", pow, 2, 10)
+    assert future.result(timeout=60) == 1024
+
+
+def test_submit_rejects_jobs_beyond_max_depth(job_queue):
+    future = job_queue.submit("slow", time.sleep, 1)
+    with pytest.raises(QueueFullError):
+        job_queue.submit("rejected", pow, 2, 10)
+    future.result(timeout=60)
+
+
+def test_finished_jobs_free_their_slot(job_queue):
+    job_queue.submit("first", pow, 2, 10).result(timeout=60)
+    assert job_queue.depth == 0
+    assert job_queue.submit("second", pow, 2, 3).result(timeout=60) == 8
+
+
+def test_on_done_is_called_with_the_future():
+    queue = JobQueue(max_workers=1, max_depth=1)
+    finished = []
+    future = queue.submit("job", pow, 2, 10, on_done=finished.append)
+    # Shutting down waits for the pool to hand out all results and run all callbacks.
+    queue.shutdown(wait=True)
+    assert finished == [future]
+    assert queue.depth == 0
+
+
+def test_web_workers_share_the_cpus_by_default(monkeypatch):
+    monkeypatch.setattr("os.cpu_count", lambda: 8)
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    assert default_max_workers() == 2
+    monkeypatch.setenv("WEB_CONCURRENCY", "16")
+    assert default_max_workers() == 1
+    monkeypatch.delenv("WEB_CONCURRENCY")
+    assert default_max_workers() == 8
+
+
+def test_submit_all_combines_the_results_in_order():
+    queue = JobQueue(max_workers=2, max_depth=3)
+    finished = []
+    future = queue.submit_all(
+        "job", pow, [(2, 3), (2, 4), (3, 2)], list, on_done=finished.append
+    )
+    assert future.result(timeout=60) == [8, 16, 9]
+    queue.shutdown(wait=True)
+    assert finished == [future]
+    assert queue.depth == 0
+
+
+def test_submit_all_fails_if_any_part_does():
+    queue = JobQueue(max_workers=2, max_depth=2)
+    future = queue.submit_all("job", pow, [(2, 3), (2, "x")], list)
+    with pytest.raises(TypeError):
+        future.result(timeout=60)
+    queue.shutdown()
+
+
+def test_submit_all_rejects_all_parts_unless_they_fit(job_queue):
+    with pytest.raises(QueueFullError):
+        job_queue.submit_all("job", pow, [(2, 3), (2, 4)], list)
+    assert job_queue.depth == 0
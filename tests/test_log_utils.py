@@ -0,0 +1,15 @@
+from web import log_utils
+from web.log_utils import diagnostics_enabled, job_diagnostics
+
+
+def test_job_diagnostics_are_scoped_to_the_job(monkeypatch):
+    monkeypatch.setattr(log_utils, "VERBOSE_LOGS", False)
+    with job_diagnostics("watched", True), job_diagnostics("unwatched", False):
+        assert diagnostics_enabled("watched")
+        assert not diagnostics_enabled("unwatched")
+    assert not diagnostics_enabled("watched")
+
+
+def test_verbose_logs_enable_diagnostics_for_every_job(monkeypatch):
+    monkeypatch.setattr(log_utils, "VERBOSE_LOGS", True)
+    assert diagnostics_enabled("any job")
@@ -0,0 +1,63 @@
+from web.mechanisms import (
+    canonicalize_coefficient_array,
+    make_coefficient_array,
+    mechanism_fingerprint,
+    reachable_species,
+)
+
+SPECIES = ["A", "B", "C"]
+
+
+def test_make_coefficient_array():
+    reactions = [["A", "B", "C", ""], ["C", "", "A", "A"], ["A", "X", "", ""]]
+    assert make_coefficient_array(reactions, SPECIES) == [
+        [1, 1, -1],
+        [-2, 0, 1],
+        # Unknown species are ignored.
+        [1, 0, 0],
+    ]
+
+
+def test_canonicalize_drops_net_zero_reactions_and_keeps_repeated_ones():
+    assert canonicalize_coefficient_array(
+        [[1, 1, -1], [0, 0, 0], [-1, -1, 1], [1, 1, -1]]
+    ) == [[-1, -1, 1], [1, 1, -1], [1, 1, -1]]
+
+
+def test_equivalent_mechanisms_share_a_fingerprint():
+    mechanism = [["A", "B", "C", ""], ["C", "", "A", "A"]]
+    equivalent = [
+        ["C", "", "A", "A"],
+        # Slots swapped, and a reaction that changes nothing.
+        ["B", "A", "", "C"],
+        ["A", "B", "A", "B"],
+    ]
+    assert mechanism_fingerprint(mechanism, SPECIES) == mechanism_fingerprint(
+        equivalent, SPECIES
+    )
+    # Repeating a reaction multiplies its rate, so it makes a different mechanism.
+    assert mechanism_fingerprint(mechanism, SPECIES) != mechanism_fingerprint(
+        mechanism + [["A", "B", "C", ""]], SPECIES
+    )
+    # The direction of a reaction matters.
+    reversed_mechanism = [["C", "", "A", "B"], ["C", "", "A", "A"]]
+    assert mechanism_fingerprint(mechanism, SPECIES) != mechanism_fingerprint(
+        reversed_mechanism, SPECIES
+    )
+
+
+def test_reachable_species():
+    species = ["A", "B", "C", "D", "E"]
+    coefficient_array = make_coefficient_array(
+        [
+            ["A", "", "B", ""],
+            # Runs backwards, from C alone.
+            ["D", "", "C", ""],
+            # Only runs, backwards, once D is present.
+            ["A", "E", "D", ""],
+        ],
+        species,
+    )
+    assert reachable_species(coefficient_array, [0]) == {0, 1}
+    assert reachable_species(coefficient_array, [0, 2]) == {0, 1, 2, 3, 4}
+    assert reachable_species(coefficient_array, []) == set()
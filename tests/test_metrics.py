@@ -0,0 +1,73 @@
+from web.metrics import Metrics, stage_timings, timed
+
+
+def test_timed_adds_up_stages_within_a_job():
+    with timed("outside"):
+        pass
+    with stage_timings() as timings:
+        for _ in range(2):
+            with timed("stage"):
+                pass
+    assert list(timings) == ["stage"]
+    assert timings["stage"] >= 0
+
+
+def test_render_prometheus_text():
+    metrics = Metrics()
+    metrics.declare("jobs_total", "counter", "Jobs.")
+    metrics.declare("stage_seconds", "histogram", "Stages.")
+    metrics.increment("jobs_total", status="success")
+    metrics.increment("jobs_total", status="success")
+    metrics.observe("stage_seconds", 0.3, stage="plotting")
+    text = metrics.render()
+    assert "# TYPE ckwatson_jobs_total counter" in text
+    assert 'ckwatson_jobs_total{status="success"} 2.0' in text
+    assert 'ckwatson_stage_seconds_bucket{le="0.25",stage="plotting"} 0.0' in text
+    assert 'ckwatson_stage_seconds_bucket{le="0.5",stage="plotting"} 1.0' in text
+    assert 'ckwatson_stage_seconds_bucket{le="+Inf",stage="plotting"} 1.0' in text
+    assert 'ckwatson_stage_seconds_count{stage="plotting"} 1.0' in text
+
+
+def test_gauges_with_a_ttl_expire_unless_set_again(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("web.metrics.time.monotonic", lambda: now[0])
+    metrics = Metrics()
+    metrics.declare("queue_depth", "gauge", "Depth.")
+    metrics.set("queue_depth", 3, ttl=60, worker="1")
+    metrics.set("queue_depth", 1, ttl=60, worker="2")
+    now[0] += 50
+    metrics.set("queue_depth", 2, ttl=60, worker="2")
+    now[0] += 20
+    text = metrics.render()
+    assert 'worker="1"' not in text
+    assert 'ckwatson_queue_depth{worker="2"} 2' in text
+
+
+def test_render_orders_buckets_by_their_bounds():
+    metrics = Metrics()
+    metrics.declare("stage_seconds", "histogram", "Stages.")
+    metrics.observe("stage_seconds", 3.0, stage="true_model")
+    metrics.observe("stage_seconds", 0.3, stage="plotting")
+    lines = metrics.render().splitlines()
+    bounds = [
+        line.split('le="')[1].split('"')[0]
+        for line in lines
+        if line.startswith("ckwatson_stage_seconds_bucket") and "plotting" in line
+    ]
+    assert bounds == [
+        "0.01",
+        "0.05",
+        "0.1",
+        "0.25",
+        "0.5",
+        "1.0",
+        "2.5",
+        "5.0",
+        "10.0",
+        "30.0",
+        "60.0",
+        "+Inf",
+    ]
+    # The buckets of each label set come right before its sum and count.
+    plotting = [i for i, line in enumerate(lines) if "plotting" in line]
+    assert plotting == list(range(plotting[0], plotting[0] + len(bounds) + 2))
@@ -0,0 +1,29 @@
+import time
+
+from web.profiling import SamplingProfiler, profile_job
+
+
+def busy_stage(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_sampling_profiler_folds_stacks():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    busy_stage(0.1)
+    profiler.stop()
+    lines = profiler.folded().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert any("busy_stage (test_profiling.py:" in line for line in lines)
+
+
+def test_profile_job_only_profiles_jobs_asking_for_it():
+    job = profile_job(lambda data, redis_url=None: {"status": "success"})
+    assert job({"jobID": "a"}) == {"status": "success"}
+    result = job({"jobID": "b", "profile": True})
+    assert result["status"] == "success"
+    assert set(result["profile"]) == {"seconds", "interval", "folded"}
@@ -0,0 +1,70 @@
+import json
+
+import numpy as np
+import pytest
+
+from web.puzzle_registry import InvalidPuzzleError, PuzzleRegistry
+
+
+def puzzle_definition(**overrides):
+    base = {
+        "coefficient_dict": {"B": 1, "A": 0},
+        "energy_dict": {"A": 10.0, "B": 20.0},
+        "coefficient_array": [[1.0, -1.0]],
+        "reagents": ["A"],
+        "reagentPERs": {"A": [False]},
+    }
+    base.update(overrides)
+    return base
+
+
+@pytest.fixture
+def registry(tmp_path):
+    (tmp_path / "schema.json").write_text("{}")
+    (tmp_path / "Simple.json").write_text(json.dumps(puzzle_definition()))
+    return PuzzleRegistry(str(tmp_path))
+
+
+def test_names_excludes_schema(registry, tmp_path):
+    assert registry.names() == ["Simple"]
+    (tmp_path / "Another.json").write_text(json.dumps(puzzle_definition()))
+    assert registry.names() == ["Another", "Simple"]
+
+
+def test_get_prebuilds_arrays_once(registry):
+    entry = registry.get("Simple")
+    assert entry.species_list == ["A", "B"]
+    np.testing.assert_array_equal(entry.coefficient_array, [[1.0, -1.0]])
+    assert registry.get("Simple") is entry
+
+
+def test_get_reloads_changed_file(registry, tmp_path):
+    entry = registry.get("Simple")
+    (tmp_path / "Simple.json").write_text(
+        json.dumps(puzzle_definition(energy_dict={"A": 10.0, "B": 200.0}))
+    )
+    reloaded = registry.get("Simple")
+    assert reloaded is not entry
+    assert reloaded.content_hash != entry.content_hash
+
+
+def test_get_rejects_inconsistent_puzzle(registry, tmp_path):
+    (tmp_path / "Broken.json").write_text(
+        json.dumps(puzzle_definition(reagentPERs={"A": [True, False]}))
+    )
+    with pytest.raises(InvalidPuzzleError):
+        registry.get("Broken")
+
+
+@pytest.mark.parametrize("content", [b'{"coefficient_dict": {"A"', b"\xff\xfe{}"])
+def test_get_rejects_corrupt_puzzle_file(registry, tmp_path, content):
+    (tmp_path / "Corrupt.json").write_bytes(content)
+    with pytest.raises(InvalidPuzzleError):
+        registry.get("Corrupt")
+
+
+def test_get_rejects_schema_and_unknown_puzzles(registry):
+    with pytest.raises(FileNotFoundError):
+        registry.get("schema")
+    with pytest.raises(FileNotFoundError):
+        registry.get("Missing")
@@ -0,0 +1,81 @@
+import json
+import logging
+import time
+
+import pytest
+
+from web import redis_utils
+from web.redis_utils import RedisJobStream, stream_job_logs
+
+
+class FakeRedis:
+    """Records what would be published, with one subscriber on every channel."""
+
+    def __init__(self):
+        self.published = []
+        self.round_trips = 0
+
+    def pubsub_numsub(self, channel):
+        return [(channel, 1)]
+
+    def smembers(self, key):
+        return set()
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, fake_redis):
+        self.fake_redis = fake_redis
+        self.published = []
+
+    def publish(self, channel, message):
+        self.published.append((channel, json.loads(message)["data"]["data"]))
+
+    def rpush(self, key, value):
+        pass
+
+    def expire(self, key, timeout):
+        pass
+
+    def execute(self):
+        self.fake_redis.round_trips += 1
+        self.fake_redis.published += self.published
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(redis_utils.redis.Redis, "from_url", lambda url: fake)
+    return fake
+
+
+def test_messages_are_published_in_batches(fake_redis):
+    stream = RedisJobStream("job", "redis://", flush_interval=60)
+    for i in range(100):
+        stream.write(f"line {i}\n")
+    stream.close(wait=True)
+    text = "".join(message for _, message in fake_redis.published)
+    assert text == "".join(f" line {i}\n" for i in range(100))
+    assert fake_redis.round_trips <= 2
+
+
+def test_messages_beyond_the_buffer_are_dropped(fake_redis):
+    stream = RedisJobStream("job", "redis://", flush_interval=60, max_buffer_chars=20)
+    for i in range(10):
+        stream.write("0123456789")
+    stream.close(wait=True)
+    text = "".join(message for _, message in fake_redis.published)
+    assert text.count("0123456789") < 10
+    assert "log messages were dropped" in text
+
+
+def test_stream_job_logs_publishes_everything_before_returning(fake_redis, monkeypatch):
+    # Nobody is subscribed, so the stream would otherwise wait out its grace period.
+    monkeypatch.setattr(fake_redis, "pubsub_numsub", lambda channel: [(channel, 0)])
+    start = time.monotonic()
+    with stream_job_logs("job", "redis://"):
+        logging.getLogger("job").warning("last words")
+    assert time.monotonic() - start < 1
+    assert [message for _, message in fake_redis.published] == [" last words\n"]
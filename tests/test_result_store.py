@@ -0,0 +1,36 @@
+import gzip
+import json
+import random
+
+from web.result_store import ResultStore
+
+RESULT = {"status": "success", "plot_combined": "<svg>" * 1000, "score": 42.0}
+
+
+def test_get_attaches_the_job_id():
+    store = ResultStore()
+    store.put("key", RESULT)
+    assert store.get("key", "job") == {**RESULT, "jobID": "job"}
+    assert store.get("other key", "job") is None
+
+
+def test_get_gzipped_is_valid_gzip_for_any_job():
+    store = ResultStore()
+    store.put("key", RESULT)
+    for job_id in ["first", 'a "quoted" job']:
+        body = store.get_gzipped("key", job_id)
+        assert json.loads(gzip.decompress(body)) == {**RESULT, "jobID": job_id}
+    # The bulk of the result is stored compressed.
+    assert len(store.get_gzipped("key", "job")) < len(json.dumps(RESULT)) / 10
+
+
+def test_local_tier_is_bounded_by_size():
+    store = ResultStore(max_bytes=200)
+    # Hard to compress, so that each entry takes well over half of the cache.
+    payloads = [random.Random(seed).randbytes(100).hex() for seed in range(2)]
+    store.put("first", RESULT)
+    store.put("second", {"status": "success", "payload": payloads[0]})
+    store.put("third", {"status": "success", "payload": payloads[1]})
+    assert store.local.size <= 200
+    assert "third" in store
+    assert "second" not in store
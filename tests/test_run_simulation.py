@@ -1,6 +1,17 @@
 import numpy as np
 
-from web.run_simulation import make_reaction_mechanism_for_reagent
+from web.puzzle_registry import PuzzleEntry
+from web.run_simulation import (
+    combine_batch_jobs,
+    get_true_data,
+    make_reaction_mechanism_for_reagent,
+    make_true_data_cache_key,
+    prune_proposal,
+    run_batch_job,
+    run_sweep_job,
+    simulate_batch,
+    simulate_sweep,
+)
 
 
 def test_make_reaction_mechanism_for_reagent_for_normal_case():
@@ -38,3 +49,159 @@ def test_make_reaction_mechanism_for_reagent_for_normal_case():
     # Check energies for each species
     assert rm_dict["molecular_species_dict"]["A"].energy == 10.0
     assert rm_dict["molecular_species_dict"]["B"].energy == 20.0
+
+
+def test_true_data_cache_key_ignores_order_of_conditions():
+    a = {"name": "A", "amount": 1.0, "temperature": 273.15}
+    b = {"name": "B", "amount": 2.0, "temperature": 300.0}
+    key = make_true_data_cache_key("puzzle-hash", 300.0, [a, b])
+    assert key == make_true_data_cache_key("puzzle-hash", 300.0, [b, a])
+    assert key != make_true_data_cache_key("puzzle-hash", 310.0, [a, b])
+    assert key != make_true_data_cache_key("other-hash", 300.0, [a, b])
+
+
+def test_each_job_simulates_its_own_copy_of_the_puzzle(
+    toy_puzzle, fake_kernel, monkeypatch
+):
+    built = []
+
+    def fake_make_puzzle(job_id, puzzle):
+        built.append(job_id)
+        return {"reagents": ["A"]}
+
+    monkeypatch.setattr("web.run_simulation.make_puzzle", fake_make_puzzle)
+    conditions = [{"name": "A", "amount": 1.0, "temperature": 273.15}]
+    for job_id, temperature in (("first", 280.0), ("second", 300.0)):
+        get_true_data(job_id, toy_puzzle, temperature, conditions, None)
+    assert built == ["first"]
+    first, second = (run[1] for run in fake_kernel.true)
+    assert first == second == toy_puzzle.puzzle
+    assert first is not second
+    assert toy_puzzle.puzzle is not first and toy_puzzle.puzzle is not second
+
+
+def test_simulate_batch_simulates_true_model_once(toy_puzzle, fake_kernel):
+    data = {
+        "jobID": "batch_job",
+        "conditions": [{"name": "A", "amount": 1.0, "temperature": 273.15}],
+        # The empty mechanism leaves B out, so its simulation only gets the rows of A.
+        "mechanisms": [[["A", "", "B", ""]], [["B", "", "A", ""]], []],
+    }
+    result = simulate_batch(data, toy_puzzle, 300.0)
+    assert len(fake_kernel.true) == 1
+    assert [each["score"] for each in result["results"]] == [100.0] * 3
+    assert all("plot_combined" not in each for each in result["results"])
+
+
+def test_simulate_batch_simulates_equivalent_mechanisms_once(toy_puzzle, fake_kernel):
+    data = {
+        "jobID": "batch_job",
+        "conditions": [{"name": "A", "amount": 1.0, "temperature": 273.15}],
+        "mechanisms": [
+            [["A", "", "B", ""]],
+            [["", "A", "", "B"], ["A", "", "A", ""]],
+            [["B", "", "A", ""]],
+        ],
+    }
+    result = simulate_batch(data, toy_puzzle, 300.0)
+    assert len(fake_kernel.proposed) == 2
+    assert len(result["results"]) == 3
+
+
+def test_combine_batch_jobs_keeps_the_order_of_mechanisms():
+    parts = [
+        {
+            "status": "success",
+            "results": [{"score": 1.0}, {"score": 2.0}],
+            "seconds": 2.0,
+            "timings": {"total": 2.0},
+            "cache_stats": {"true_data": {"misses": 1}},
+        },
+        {
+            "status": "success",
+            "results": [{"score": 3.0}],
+            "seconds": 1.0,
+            "timings": {"total": 1.0},
+            "cache_stats": {"true_data": {"misses": 1}},
+        },
+    ]
+    result = combine_batch_jobs({"temperature": 300.0}, parts)
+    assert [each["score"] for each in result["results"]] == [1.0, 2.0, 3.0]
+    assert result["seconds"] == 2.0
+    assert result["timings"] == {"total": 3.0}
+    assert result["cache_stats"] == {"true_data": {"misses": 2}}
+    parts[1] = {"status": "error", "timings": {"total": 0.5}}
+    assert combine_batch_jobs({"temperature": 300.0}, parts)["status"] == "error"
+
+
+def test_simulate_sweep_makes_the_solution_once(toy_puzzle, fake_kernel, monkeypatch):
+    solutions = []
+
+    def fake_make_solution(*args):
+        solutions.append(args)
+        return object()
+
+    monkeypatch.setattr("web.run_simulation.make_solution", fake_make_solution)
+    data = {
+        "jobID": "sweep_job",
+        "reactions": [["A", "", "B", ""]],
+        "conditions": [{"name": "A", "amount": 1.0, "temperature": 273.15}],
+        "sweep": [{"temperature": 280.0}, {"temperature": 300.0}],
+    }
+    result = simulate_sweep(data, toy_puzzle, plot=False)
+    assert len(solutions) == 1
+    assert len(fake_kernel.true) == 2
+    assert [each["temperature"] for each in result["results"]] == [280.0, 300.0]
+    assert result["results"][0]["user"] == {"A": 0.5, "B": 0.5}
+
+
+def test_run_batch_job_reports_its_stages(toy_puzzle, fake_kernel, monkeypatch):
+    monkeypatch.setattr(
+        "web.run_simulation.puzzle_registry.get", lambda name: toy_puzzle
+    )
+    result = run_batch_job(
+        {
+            "jobID": "batch_job",
+            "puzzle": "toy",
+            "temperature": 300.0,
+            "conditions": [{"name": "A", "amount": 1.0, "temperature": 273.15}],
+            "mechanisms": [[["A", "", "B", ""]]],
+        }
+    )
+    assert result["status"] == "success"
+    assert {"puzzle_loading", "total"} <= set(result["timings"])
+    assert result["cache_stats"]["true_data"]["misses"] == 1
+
+
+def test_run_sweep_job_turns_exceptions_into_errors(monkeypatch):
+    def missing_puzzle(name):
+        raise FileNotFoundError(name)
+
+    monkeypatch.setattr("web.run_simulation.puzzle_registry.get", missing_puzzle)
+    result = run_sweep_job({"jobID": "sweep_job", "puzzle": "missing"})
+    assert result["status"] == "error"
+    assert "total" in result["timings"]
+
+
+def test_prune_proposal_leaves_out_what_can_never_be_present():
+    puzzle = PuzzleEntry.from_definition(
+        "prune",
+        {
+            "coefficient_array": [[1, -1, 0, 0], [0, 0, 1, -1]],
+            "energy_dict": {"A": 10.0, "B": 20.0, "C": 30.0, "D": 40.0},
+            "coefficient_dict": {"A": 0, "B": 1, "C": 2, "D": 3},
+            "reagentPERs": {"A": [True, False], "C": [False, True]},
+        },
+    )
+    reactions = [["B", "", "A", ""], ["C", "", "D", ""]]
+    conditions = [{"name": "A", "amount": 1.0, "temperature": 273.15}]
+    # A pre-equilibrates into B; nothing makes C or D.
+    assert prune_proposal("prune_job", puzzle, reactions, conditions) == (
+        ["A", "B"],
+        [["B", "", "A", ""]],
+    )
+    conditions.append({"name": "C", "amount": 1.0, "temperature": 273.15})
+    assert prune_proposal("prune_job", puzzle, reactions, conditions) == (
+        ["A", "B", "C", "D"],
+        reactions,
+    )
@@ -2,24 +2,7 @@ import json
 import os
 from pathlib import Path
 
-import pytest
-
-from web.main import AUTH_CODE, app, limiter
-
-
-@pytest.fixture()
-def client(tmp_path, monkeypatch):
-    # Redirect puzzles directory to a temp path for isolation
-    monkeypatch.chdir(tmp_path)
-    (tmp_path / "puzzles").mkdir()
-    app.config["TESTING"] = True
-    # Disable rate limiting for this test module to avoid hitting 5/min limit
-    try:
-        limiter.enabled = False  # type: ignore[attr-defined]
-    except Exception:
-        app.config["RATELIMIT_ENABLED"] = False
-    with app.test_client() as c:
-        yield c
+from web.main import AUTH_CODE
 
 
 def minimal_payload(**overrides):
@@ -49,6 +32,16 @@ def test_successful_save(client):
     assert (Path("puzzles") / "TestPuzzle.json").exists()
 
 
+def test_successful_save_warms_the_cache_if_enabled(client, monkeypatch):
+    started = []
+    monkeypatch.setattr("web.main.cache_warmer.start", started.append)
+    post(client, minimal_payload())
+    assert started == []
+    monkeypatch.setattr("web.main.WARM_CACHE", True)
+    post(client, minimal_payload(puzzleName="WarmPuzzle"))
+    assert started == [["WarmPuzzle"]]
+
+
 def test_duplicate_save_rejected(client):
     post(client, minimal_payload())
     r = post(client, minimal_payload())
@@ -94,3 +87,15 @@ def test_too_many_species(client):
         ),
     )
     assert r.get_json()["status"] == "danger"
+
+
+def test_play_rejects_an_invalid_puzzle(client):
+    (Path("puzzles") / "Broken.json").write_text(json.dumps({"energy_dict": {}}))
+    r = client.get("/play/Broken")
+    assert r.status_code == 400
+
+
+def test_play_rejects_a_corrupt_puzzle_file(client):
+    (Path("puzzles") / "Corrupt.json").write_text('{"energy_dict": {')
+    r = client.get("/play/Corrupt")
+    assert r.status_code == 400
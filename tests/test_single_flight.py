@@ -0,0 +1,22 @@
+from web.single_flight import SingleFlight
+
+
+def test_first_job_leads_and_identical_jobs_follow():
+    single_flight = SingleFlight()
+    assert single_flight.join("key", "first") is None
+    assert single_flight.join("key", "second") == "first"
+    assert single_flight.join("other key", "third") is None
+
+
+def test_release_lets_the_next_job_lead():
+    single_flight = SingleFlight()
+    single_flight.join("key", "first")
+    single_flight.release("key", "first")
+    assert single_flight.join("key", "second") is None
+
+
+def test_only_the_leader_can_release():
+    single_flight = SingleFlight()
+    single_flight.join("key", "first")
+    single_flight.release("key", "second")
+    assert single_flight.join("key", "third") == "first"
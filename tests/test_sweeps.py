@@ -0,0 +1,38 @@
+import numpy as np
+
+from web.sweeps import draw_sweep_plot, equilibrium_composition, sweep_points
+
+
+def test_sweep_points_default_to_the_request():
+    conditions = [{"name": "A", "amount": 1, "temperature": 273.15}]
+    other_conditions = [{"name": "A", "amount": 2, "temperature": 273.15}]
+    data = {
+        "temperature": 300,
+        "conditions": conditions,
+        "sweep": [{"temperature": 310}, {"conditions": other_conditions}],
+    }
+    assert sweep_points(data) == [
+        {"temperature": 310, "conditions": conditions},
+        {"temperature": 300, "conditions": other_conditions},
+    ]
+
+
+def test_equilibrium_composition_is_the_last_time_step():
+    data = np.array([[0.0, 1.0, 2.0], [1.0, 0.5, 0.25], [0.0, 0.5, 0.75]])
+    assert equilibrium_composition(data, ["A", "B"]) == {"A": 0.25, "B": 0.75}
+    assert equilibrium_composition(None, ["A", "B"]) is None
+
+
+def test_draw_sweep_plot_handles_failed_proposals():
+    results = [
+        {
+            "temperature": temperature,
+            "score": 0.0 if temperature == 310 else 90.0,
+            "true": {"A": 0.2, "B": 0.8},
+            "user": None if temperature == 310 else {"A": 0.3, "B": 0.7},
+        }
+        for temperature in (320, 300, 310)
+    ]
+    svg = draw_sweep_plot(results, ["A", "B"])
+    assert svg.lstrip().startswith("<?xml")
+    assert "</svg>" in svg
@@ -0,0 +1,89 @@
+import base64
+
+import numpy as np
+
+from web.trajectories import (
+    alignment_statistics,
+    downsample,
+    simplify,
+    trajectories_to_columns,
+    trajectories_to_json,
+)
+
+
+def make_trajectory(num_steps=101):
+    time = np.linspace(0, 10, num_steps)
+    return np.vstack([time, np.exp(-time), 1 - np.exp(-time)])
+
+
+def test_downsample_keeps_first_and_last_time_steps():
+    data = make_trajectory()
+    result = downsample(data, 11)
+    assert result.shape == (3, 11)
+    np.testing.assert_array_equal(result[:, 0], data[:, 0])
+    np.testing.assert_array_equal(result[:, -1], data[:, -1])
+
+
+def test_downsample_leaves_short_trajectories_alone():
+    data = make_trajectory(5)
+    assert downsample(data, 10) is data
+
+
+def test_trajectories_to_json_is_keyed_by_species():
+    result = trajectories_to_json(make_trajectory(), ["A", "B"], 3)
+    assert len(result["time"]) == 3
+    assert result["time"][0] == 0.0 and result["time"][-1] == 10.0
+    assert list(result["concentrations"]) == ["A", "B"]
+    assert result["concentrations"]["A"][0] == 1.0
+
+
+def test_alignment_statistics():
+    true_aligned = np.array([[0.0, 1.0], [1.0, 1.0], [2.0, 2.0]])
+    user_aligned = np.array([[0.0, 1.0], [1.0, 0.5], [2.0, 2.0]])
+    result = alignment_statistics(true_aligned, user_aligned, ["A", "B"])
+    assert result["max_abs_error"] == {"A": 0.5, "B": 0.0}
+    assert result["mean_abs_error"] == {"A": 0.25, "B": 0.0}
+    assert result["relative_error"] == 0.5 / 6
+
+
+def test_downsample_keeps_spikes():
+    data = make_trajectory(1001)
+    data[1, 500] = 5.0
+    result = downsample(data, 20)
+    assert result.shape == (3, 20)
+    assert result[1].max() == 5.0
+
+
+def test_trajectories_to_columns_round_trip():
+    data = make_trajectory(50)
+    result = trajectories_to_columns(data, ["A", "B"], 10)
+    assert result["length"] == 10
+    time = np.frombuffer(base64.b64decode(result["time"]), dtype="<f4")
+    concentrations = np.frombuffer(
+        base64.b64decode(result["concentrations"]), dtype="<f4"
+    ).reshape(2, 10)
+    np.testing.assert_allclose(time, downsample(data, 10)[0], rtol=1e-6)
+    np.testing.assert_allclose(concentrations, downsample(data, 10)[1:], rtol=1e-6)
+
+
+def test_simplify_keeps_few_points_on_straight_lines():
+    time = np.linspace(0, 10, 1001)
+    data = np.vstack([time, 2 * time, 5 - time])
+    result = simplify(data, 1e-6)
+    np.testing.assert_array_equal(result, data[:, [0, -1]])
+
+
+def test_simplify_stays_within_tolerance():
+    data = make_trajectory(1001)
+    tolerance = 1e-3
+    result = simplify(data, tolerance)
+    assert result.shape[1] < data.shape[1]
+    for row in range(1, data.shape[0]):
+        interpolated = np.interp(data[0], result[0], result[row])
+        span = data[row].max() - data[row].min()
+        assert np.abs(interpolated - data[row]).max() <= tolerance * span
+
+
+def test_simplify_without_tolerance_keeps_everything():
+    data = make_trajectory()
+    assert simplify(data, 0) is data
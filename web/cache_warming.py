@@ -0,0 +1,116 @@
+import logging
+import time
+from concurrent.futures import Future
+from threading import Thread
+from typing import Callable, Dict, Iterable, List, Optional
+
+from web.mechanisms import reactions_from_coefficient_array
+from web.puzzle_registry import PuzzleEntry, PuzzleRegistry
+
+logger = logging.getLogger(__name__)
+
+# The inputs the play page starts with: every reagent at 1 mol, taken out of a fridge at 273.15 K, reacting at 300 K.
+# Integers where the browser sends integers, so that these requests are cached under the same keys as the browser's.
+DEFAULT_AMOUNT = 1
+DEFAULT_REAGENT_TEMPERATURE = 273.15
+DEFAULT_TEMPERATURE = 300
+
+
+def default_conditions(puzzle: PuzzleEntry) -> List[Dict]:
+    """The starting conditions of the play page, listing the reagents in the same order as it does."""
+    reagents = puzzle.definition.get("reagents") or list(
+        puzzle.definition["reagentPERs"]
+    )
+    return [
+        {
+            "name": species,
+            "amount": DEFAULT_AMOUNT,
+            "temperature": DEFAULT_REAGENT_TEMPERATURE,
+        }
+        for species in puzzle.definition["coefficient_dict"]
+        if species in reagents
+    ]
+
+
+def default_requests(puzzle: PuzzleEntry) -> List[Dict]:
+    """The `/plot` requests most players send first: the default conditions, with no reactions or the true ones."""
+    mechanisms = {
+        "empty": [],
+        "true": reactions_from_coefficient_array(
+            puzzle.definition["coefficient_array"], puzzle.species_list
+        ),
+    }
+    return [
+        {
+            "jobID": f"warm-{puzzle.content_hash[:12]}-{label}",
+            "puzzle": puzzle.name,
+            "reactions": reactions,
+            "temperature": DEFAULT_TEMPERATURE,
+            "conditions": default_conditions(puzzle),
+        }
+        for label, reactions in mechanisms.items()
+    ]
+
+
+class CacheWarmer:
+    """
+    Runs the default requests of puzzles ahead of time, so that the first players of a puzzle hit the cache.
+
+    Jobs are submitted one at a time, and only while the job queue is idle, so that warming never delays players.
+    `submit(data)` submits a request and returns its future (or None if it was not submitted, e.g. because an
+    identical job is running already), and `is_warm(data)` tells whether its result is cached already.
+    """
+
+    def __init__(
+        self,
+        registry: PuzzleRegistry,
+        submit: Callable[[Dict], Optional[Future]],
+        is_warm: Callable[[Dict], bool],
+        is_idle: Callable[[], bool],
+        poll_interval: float = 1.0,
+    ):
+        self.registry = registry
+        self.submit = submit
+        self.is_warm = is_warm
+        self.is_idle = is_idle
+        self.poll_interval = poll_interval
+        self.progress: Dict[str, int] = {
+            "total": 0,
+            "warmed": 0,
+            "skipped": 0,
+            "failed": 0,
+        }
+
+    def warm(self, names: Optional[Iterable[str]] = None):
+        """Warm the cache for the given puzzles (by default, all of them), and return once done."""
+        names = self.registry.names() if names is None else list(names)
+        requests = []
+        for name in names:
+            try:
+                requests += default_requests(self.registry.get(name))
+            except (FileNotFoundError, ValueError) as e:
+                logger.warning("Not warming puzzle %r: %r", name, e)
+        self.progress["total"] += len(requests)
+        for data in requests:
+            self._warm_one(data)
+            logger.info("Cache warming progress: %s", self.progress)
+
+    def _warm_one(self, data: Dict):
+        if self.is_warm(data):
+            self.progress["skipped"] += 1
+            return
+        while not self.is_idle():
+            time.sleep(self.poll_interval)
+        future = self.submit(data)
+        if future is None:
+            self.progress["skipped"] += 1
+        elif future.exception() is None and future.result()["status"] == "success":
+            self.progress["warmed"] += 1
+        else:
+            self.progress["failed"] += 1
+
+    def start(self, names: Optional[Iterable[str]] = None) -> Thread:
+        """Warm the cache in the background. Under gevent, the thread is a greenlet."""
+        thread = Thread(target=self.warm, args=(names,), daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,167 @@
+import hashlib
+import io
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import numpy as np
+import redis
+from cachelib import RedisCache
+
+logger = logging.getLogger(__name__)
+
+# The cache shared by all processes of this deployment, if Redis is available. See `configure_shared_backend`.
+shared_backend: Optional[RedisCache] = None
+
+
+def configure_shared_backend(redis_url: Optional[str], default_timeout: int = 3600):
+    """Make all `TieredCache`s of this process share their entries via Redis (or nothing, if `redis_url` is None)."""
+    global shared_backend
+    if redis_url is None:
+        shared_backend = None
+        return
+    shared_backend = RedisCache(
+        host=redis.Redis.from_url(redis_url),
+        key_prefix="ckwatson:",
+        default_timeout=default_timeout,
+    )
+
+
+def hash_json(obj: Any) -> str:
+    """A stable digest of any JSON-serializable object."""
+    return hashlib.sha256(json.dumps(obj, sort_keys=True).encode()).hexdigest()
+
+
+def encode_array(array: np.ndarray) -> bytes:
+    """Serialize a NumPy array into the compact `.npy` binary format."""
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def decode_array(data: bytes) -> np.ndarray:
+    return np.load(io.BytesIO(data), allow_pickle=False)
+
+
+class LRUCache:
+    """A dict-like cache that holds at most `maxsize` entries, evicting the least recently used one first."""
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default=None):
+        if key not in self._entries:
+            return default
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def set(self, key: Hashable, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class BytesLRUCache:
+    """Like `LRUCache`, but holding `bytes` values that add up to at most `max_bytes`."""
+
+    def __init__(self, max_bytes: int = 64 * 2**20):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default=None):
+        if key not in self._entries:
+            return default
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def set(self, key: Hashable, value: bytes):
+        self.pop(key)
+        # A value larger than the whole cache would only evict everything else, and then itself.
+        if len(value) > self.max_bytes:
+            return
+        self._entries[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def pop(self, key: Hashable):
+        value = self._entries.pop(key, None)
+        if value is not None:
+            self.size -= len(value)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+
+class TieredCache:
+    """
+    A two-tier cache: a small in-process LRU cache in front of the cache shared across processes (if configured).
+
+    Both tiers hold `encode(value)`, and every read decodes it again. For arrays, this means that each caller gets its
+    own copy, so a caller modifying its array can never corrupt the cache.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        maxsize: int = 128,
+        encode: Callable[[Any], Any] = lambda value: value,
+        decode: Callable[[Any], Any] = lambda value: value,
+    ):
+        self.namespace = namespace
+        self.local = LRUCache(maxsize)
+        self.encode = encode
+        self.decode = decode
+        self.stats: Dict[str, int] = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+
+    def _shared_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key: str):
+        """Return the cached value for `key`, or None."""
+        encoded = self.local.get(key)
+        if encoded is not None:
+            self.stats["local_hits"] += 1
+            return self.decode(encoded)
+        if shared_backend is not None:
+            try:
+                encoded = shared_backend.get(self._shared_key(key))
+            except redis.RedisError as e:
+                logger.warning("Failed reading %s from shared cache: %r", key, e)
+            if encoded is not None:
+                self.stats["shared_hits"] += 1
+                self.local.set(key, encoded)
+                return self.decode(encoded)
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, key: str, value):
+        encoded = self.encode(value)
+        self.local.set(key, encoded)
+        if shared_backend is not None:
+            try:
+                shared_backend.set(self._shared_key(key), encoded)
+            except redis.RedisError as e:
+                logger.warning("Failed writing %s to shared cache: %r", key, e)
@@ -0,0 +1,175 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from web.caching import configure_shared_backend
+from web.log_utils import configure_logging
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is already at its maximum depth."""
+
+
+def init_worker(redis_url: Optional[str] = None):
+    """Prepare a freshly spawned simulation worker process the same way as the web process."""
+    np.seterr(all="warn")
+    configure_logging()
+    configure_shared_backend(redis_url)
+
+
+def default_max_workers() -> int:
+    """
+    How many worker processes each web worker starts by default: its share of the CPUs.
+
+    Every web worker has a pool of its own, so they split the CPUs between them. Their number is read from
+    `WEB_CONCURRENCY`, which gunicorn also reads as its default number of workers.
+    """
+    web_workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    return max(1, (os.cpu_count() or 1) // max(1, web_workers))
+
+
+class JobQueue:
+    """
+    A bounded queue of simulation jobs, executed by a dedicated pool of worker processes.
+
+    Simulations are CPU-bound, so running them inside a gevent worker would block every other greenlet of that worker.
+    Handing them over to separate processes keeps page loads and `/save` responsive while jobs are running.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_depth: int = 32,
+        initializer: Optional[Callable] = init_worker,
+        initargs: tuple = (),
+    ):
+        self.max_workers = max_workers or default_max_workers()
+        # How many jobs may be queued or running at the same time before we push back on clients.
+        self.max_depth = max_depth
+        self.initializer = initializer
+        self.initargs = initargs
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._futures: Dict[str, Future] = {}
+        self._lock = Lock()
+
+    @property
+    def depth(self) -> int:
+        """Number of jobs that are either waiting for a worker or running."""
+        return sum(1 for future in self._futures.values() if not future.done())
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # The pool is created lazily, so that importing the web app (e.g. in tests) does not spawn any process.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                # Forking a gevent-patched process is unsafe, so always start workers from a clean interpreter.
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self.initializer,
+                initargs=self.initargs,
+            )
+        return self._executor
+
+    def submit(
+        self,
+        job_id: str,
+        fn: Callable,
+        *args,
+        on_done: Optional[Callable[[Future], None]] = None,
+    ) -> Future:
+        """
+        Schedule `fn(*args)` on the worker pool.
+
+        `fn` and `args` must be picklable. `on_done`, if given, is called with the future once the job has finished,
+        before the job stops counting towards the queue depth.
+        Raises `QueueFullError` if `max_depth` jobs are already queued or running.
+        """
+        with self._lock:
+            if self.depth >= self.max_depth:
+                raise QueueFullError(
+                    f"{self.depth} jobs are already queued (limit: {self.max_depth})."
+                )
+            future = self._get_executor().submit(fn, *args)
+            self._futures[job_id] = future
+        logger.debug("Queued job %s. Queue depth: %i.", job_id, self.depth)
+        if on_done is not None:
+            future.add_done_callback(on_done)
+        future.add_done_callback(lambda _: self._futures.pop(job_id, None))
+        return future
+
+    def submit_all(
+        self,
+        job_id: str,
+        fn: Callable,
+        args_list: List[tuple],
+        combine: Callable[[List], Any],
+        on_done: Optional[Callable[[Future], None]] = None,
+    ) -> Future:
+        """
+        Schedule `fn(*args)` for each of `args_list` as a job of its own, then `combine` their results, all on the pool.
+
+        This spreads one request over several worker processes. Returns a future of `combine([result, ...])`, with
+        the results in the order of `args_list`; it fails if any of the jobs does. Each job counts towards the queue
+        depth, and so does the combining step, as `job_id`. `on_done` is called as with `submit`.
+        Raises `QueueFullError` unless there is room for all of the jobs.
+        """
+        with self._lock:
+            if self.depth + len(args_list) > self.max_depth:
+                raise QueueFullError(
+                    f"{self.depth} jobs are already queued, and {len(args_list)} more do not fit "
+                    f"(limit: {self.max_depth})."
+                )
+            executor = self._get_executor()
+            parts = [executor.submit(fn, *args) for args in args_list]
+            for i, part in enumerate(parts):
+                self._futures[f"{job_id}/{i}"] = part
+        logger.debug(
+            "Queued job %s in %i parts. Queue depth: %i.",
+            job_id,
+            len(parts),
+            self.depth,
+        )
+        outcome: Future = Future()
+        if on_done is not None:
+            outcome.add_done_callback(on_done)
+        outcome.add_done_callback(lambda _: self._futures.pop(job_id, None))
+        remaining = [len(parts)]
+
+        def copy_outcome(combined: Future):
+            try:
+                outcome.set_result(combined.result())
+            except Exception as e:
+                outcome.set_exception(e)
+
+        def part_done(_):
+            with self._lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            try:
+                results = [part.result() for part in parts]
+                combined = executor.submit(combine, results)
+            except Exception as e:
+                # A part failed, or the pool has been shut down in the meantime.
+                outcome.set_exception(e)
+                return
+            self._futures[job_id] = outcome
+            combined.add_done_callback(copy_outcome)
+
+        for i, part in enumerate(parts):
+            part.add_done_callback(
+                lambda _, key=f"{job_id}/{i}": self._futures.pop(key, None)
+            )
+            part.add_done_callback(part_done)
+        return outcome
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
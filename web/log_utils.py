@@ -0,0 +1,43 @@
+import logging
+import os
+from contextlib import contextmanager
+from typing import Set
+
+import colorlog
+
+# Log expensive diagnostics (e.g. tables of coefficient arrays) for every job, whether anyone reads them or not.
+VERBOSE_LOGS = os.environ.get("CKWATSON_VERBOSE_LOGS", "0").lower() in ("1", "true")
+# The jobs running in this process whose expensive diagnostics are wanted; see `job_diagnostics`.
+_diagnosed_jobs: Set[str] = set()
+
+
+def configure_logging():
+    """Route all log records to a colored console handler attached to the root logger."""
+    root_logger = logging.getLogger()  # access the root logger
+    for existing_handler in list(root_logger.handlers):
+        root_logger.removeHandler(existing_handler)
+    # create a handler for printing messages onto the console
+    handler = colorlog.StreamHandler()
+    handler.setFormatter(
+        colorlog.ColoredFormatter(
+            "%(log_color)s%(levelname)s%(reset)s:%(bold)s%(name)s%(reset)s:%(message)s"
+        )
+    )
+    # attach the to-console handler to the root logger
+    root_logger.addHandler(handler)
+
+
+@contextmanager
+def job_diagnostics(job_id: str, enabled: bool):
+    """While active, `diagnostics_enabled(job_id)` is True if `enabled` (or `VERBOSE_LOGS`)."""
+    if enabled:
+        _diagnosed_jobs.add(job_id)
+    try:
+        yield
+    finally:
+        _diagnosed_jobs.discard(job_id)
+
+
+def diagnostics_enabled(job_id: str) -> bool:
+    """Whether to log expensive diagnostics for a job, which are otherwise skipped rather than built for nobody."""
+    return VERBOSE_LOGS or job_id in _diagnosed_jobs
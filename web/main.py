@@ -1,16 +1,15 @@
 #!/usr/local/bin/python3.5
 
-import datetime as dt
 import hashlib
 import json
 import logging
 import os
 import re
-import traceback
+import time
+from concurrent.futures import Future
+from functools import partial
 from pprint import pprint
 
-import colorlog
-import humanize
 import jsonschema
 import numpy as np
 from flask import Flask, jsonify, render_template, request
@@ -21,38 +20,36 @@ from flask_limiter.util import get_remote_address
 from flask_sse import sse
 from jsonschema.exceptions import ValidationError
 
-from web.redis_utils import RedisJobStream, get_redis_url, redis_available
-from web.run_simulation import simulate_experiments_and_plot
+from web.cache_warming import CacheWarmer
+from web.job_queue import JobQueue, QueueFullError
+from web.log_utils import configure_logging
+from web.mechanisms import mechanism_fingerprint
+from web.metrics import Metrics
+from web.profiling import should_profile
+from web.puzzle_registry import InvalidPuzzleError
+from web.puzzle_registry import registry as puzzle_registry
+from web.redis_utils import get_redis_url, redis_available
+from web.result_store import ResultStore
+from web.run_simulation import (
+    combine_batch_jobs,
+    combine_sweep_jobs,
+    run_batch_job,
+    run_plot_job,
+    run_sweep_job,
+)
 from web.save_a_puzzle import save_a_puzzle
+from web.single_flight import SingleFlight
+from web.sweeps import sweep_points
 
 np.seterr(all="warn")
 
-from pathlib import Path
-
-
-def all_files_in(mypath, end=""):
-    return [
-        p.stem
-        for p in Path(mypath).iterdir()
-        if p.is_file() and not p.name.startswith(".") and p.name.endswith(end)
-    ]
-
-
 # Initialize logger:
-rootLogger = logging.getLogger()  # access the root logger
-rootLogger.removeHandler(logging.getLogger().handlers[0])
-# create a handler for printing messages onto the console
-handler = colorlog.StreamHandler()
-handler.setFormatter(
-    colorlog.ColoredFormatter(
-        "%(log_color)s%(levelname)s%(reset)s:%(bold)s%(name)s%(reset)s:%(message)s"
-    )
-)
-# attach the to-console handler to the root logger
-rootLogger.addHandler(handler)
+configure_logging()
 
 
 AUTH_CODE = os.environ.get("CKWATSON_PUZZLE_AUTH_CODE", "123")
+# Requests with this header set to `AUTH_CODE` may ask for their job to be profiled, and download profiles.
+PROFILE_HEADER = "X-CKWatson-Profile"
 
 
 def create_app():
@@ -95,76 +92,534 @@ def create_app():
 # Create the Flask app and check Redis availability
 app, is_redis_available, limiter, cache = create_app()
 
+# Simulations run in a separate pool of worker processes, so that they never block the web workers.
+job_queue = JobQueue(
+    max_workers=int(os.environ.get("CKWATSON_SIMULATION_WORKERS", 0)) or None,
+    max_depth=int(os.environ.get("CKWATSON_MAX_QUEUED_JOBS", 32)),
+    initargs=(app.config["REDIS_URL"] if is_redis_available else None,),
+)
+# Results are kept compressed, and served as such to clients accepting gzip (see `result_response`).
+result_store = ResultStore(
+    app.config["REDIS_URL"] if is_redis_available else None,
+    max_bytes=int(os.environ.get("CKWATSON_RESULT_STORE_BYTES", 64 * 2**20)),
+)
+# Aggregated across all web workers through Redis, if available. Served on `/metrics`.
+metrics = Metrics(app.config["REDIS_URL"] if is_redis_available else None)
+metrics.declare(
+    "stage_seconds", "histogram", "Time spent in each stage of simulation jobs."
+)
+metrics.declare("jobs_total", "counter", "Jobs handled, by kind and outcome.")
+metrics.declare(
+    "cache_requests_total", "counter", "Cache lookups, by cache and outcome."
+)
+metrics.declare(
+    "queue_depth", "gauge", "Jobs queued or running, by web worker process."
+)
+# Identical jobs submitted while one of them is running wait for its result, instead of simulating again.
+single_flight = SingleFlight(
+    app.config["REDIS_URL"] if is_redis_available else None,
+    timeout=int(os.environ.get("CKWATSON_SINGLE_FLIGHT_TIMEOUT", 600)),
+)
+# How often a synchronous request following another job checks whether that job has finished, in seconds.
+FOLLOWER_POLL_INTERVAL = 0.2
+# How long clients are asked to wait before retrying when the job queue is full, in seconds.
+RETRY_AFTER = 5
+# How many mechanisms a single `/batch` request may evaluate.
+MAX_BATCH_SIZE = int(os.environ.get("CKWATSON_MAX_BATCH_SIZE", 500))
+# How many experiments a single `/sweep` request may simulate.
+MAX_SWEEP_POINTS = int(os.environ.get("CKWATSON_MAX_SWEEP_POINTS", 50))
+# `/batch` requests with more mechanisms than this are split into parts, run in parallel (0: never).
+BATCH_PART_SIZE = int(os.environ.get("CKWATSON_BATCH_PART_SIZE", 50))
+# `/sweep` requests with more experiments than this are split into parts, run in parallel (0: never).
+SWEEP_PART_SIZE = int(os.environ.get("CKWATSON_SWEEP_PART_SIZE", 1))
+
 # load JSON schema for Puz file for validation:
 with open("puzzles/schema.json") as f:
     schema = f.read()
 schema = json.loads(schema)
 
 
-def make_plot_cache_key(data):
+def make_simulation_key(data):
+    """
+    Identifies the simulation a job asks for, regardless of what the job returns.
+
+    Equivalent ways of writing the same mechanism share a key (see `web.mechanisms.mechanism_fingerprint`).
+    """
+    try:
+        species_list = puzzle_registry.get(data["puzzle"]).species_list
+    except (FileNotFoundError, InvalidPuzzleError):
+        # The job will fail anyway; there is nothing to canonicalize against.
+        reactions = data["reactions"]
+    else:
+        reactions = mechanism_fingerprint(data["reactions"], species_list)
     key_data = json.dumps(
         {
             "puzzle": data["puzzle"],
-            "reactions": data["reactions"],
+            "reactions": reactions,
             "temperature": data["temperature"],
             "conditions": data["conditions"],
         },
         sort_keys=True,
     )
+    return hashlib.sha256(key_data.encode()).hexdigest()
+
+
+def make_plot_cache_key(data):
+    key_data = json.dumps(
+        {
+            "simulation": make_simulation_key(data),
+            "mode": data.get("mode", "plot"),
+            "trajectories": data.get("trajectories", False),
+            "points": data.get("points"),
+            "format": data.get("format"),
+        },
+        sort_keys=True,
+    )
     return "plot_result:" + hashlib.sha256(key_data.encode()).hexdigest()
 
 
-@app.route("/plot", methods=["POST", "OPTIONS"])
-def handle_plot_request():
-    start_time = dt.datetime.now()
-    data = request.get_json()
-    job_logger = logging.getLogger(data["jobID"])
-    logger = job_logger.getChild("handle_plot_request")
-    cache_key = make_plot_cache_key(data)
-    cached_result = cache.get(cache_key)
-    if cached_result:
-        # Attach the jobID to the cached result for this request
-        logger.info(f"Cache hit for jobID {data['jobID']} with cache key {cache_key}.")
-        return jsonify({**cached_result, "jobID": data["jobID"]})
+def make_sweep_cache_key(data):
+    key_data = json.dumps(
+        {
+            "points": [
+                make_simulation_key({**data, **point}) for point in sweep_points(data)
+            ],
+            "plot": data.get("plot", True),
+        },
+        sort_keys=True,
+    )
+    return "sweep_result:" + hashlib.sha256(key_data.encode()).hexdigest()
+
+
+def make_arrays_key(data):
+    """Where the full trajectories of a score-only job are kept, for drawing its plots later on."""
+    return "arrays:" + make_simulation_key(data)
 
-    logging_handler = None
+
+def make_job_result_key(job_id):
+    return "job_result:" + job_id
+
+
+def make_job_output_key(job_id):
+    """Where the result of a job that has no cache key (e.g. a `/batch` job) is kept in the result store."""
+    return "job_output:" + job_id
+
+
+def make_profile_key(job_id):
+    return "profile:" + job_id
+
+
+def get_job_outcome(future: Future):
+    """
+    Wait for a submitted job and return its result, even if its worker process crashed.
+
+    Binary `arrays` returned by the job, its measurements and its profile are not part of the result (see
+    `finish_job`).
+    """
+    if future.exception() is not None:
+        return {"status": "error"}
+    return {
+        key: value
+        for key, value in future.result().items()
+        if key not in ("arrays", "timings", "cache_stats", "profile")
+    }
+
+
+def record_queue_depth():
+    """
+    Record the queue depth of this web worker.
+
+    The sample expires unless recorded again (on every job submitted or finished, and every scrape), so that the
+    depth of a web worker that has been restarted is not added up forever. Jobs are not expected to run for longer
+    than followers wait for them.
+    """
+    metrics.set(
+        "queue_depth",
+        job_queue.depth,
+        ttl=single_flight.timeout,
+        worker=str(os.getpid()),
+    )
+
+
+def record_job_metrics(kind, future: Future):
+    """Record the outcome of a finished job, how long its stages took, and how its caches fared."""
+    record_queue_depth()
+    if future.exception() is not None:
+        metrics.increment("jobs_total", kind=kind, status="crashed")
+        return
+    result = future.result()
+    metrics.increment("jobs_total", kind=kind, status=result["status"])
+    for stage, seconds in result.get("timings", {}).items():
+        metrics.observe("stage_seconds", seconds, stage=stage)
+    for cache_name, stats in result.get("cache_stats", {}).items():
+        for outcome, count in stats.items():
+            if count:
+                metrics.increment(
+                    "cache_requests_total", count, cache=cache_name, outcome=outcome
+                )
+
+
+def job_kind(fn):
+    """The kind of job `fn` runs, e.g. "plot" for `run_plot_job`, as recorded in `metrics`."""
+    return fn.__name__.removeprefix("run_").removesuffix("_job")
+
+
+def finish_job(job_id, cache_key, future: Future, kind="plot", arrays_key=None):
+    """
+    Store the outcome of a finished job, so that any web worker can serve it.
+
+    A successful result goes to the result store, under `cache_key` if given; the job's own entry then only points
+    to it by its `result_key`.
+    """
+    if future.exception() is not None:
+        logging.getLogger(job_id).error(
+            "The simulation worker failed: %r", future.exception()
+        )
+    record_job_metrics(kind, future)
+    result = get_job_outcome(future)
+    if arrays_key is not None and future.exception() is None:
+        arrays = future.result().get("arrays")
+        if arrays is not None:
+            cache.set(arrays_key, arrays)
+    if future.exception() is None and "profile" in future.result():
+        logging.getLogger(job_id).info(f"Profiled; see /profile/{job_id}.")
+        cache.set(make_profile_key(job_id), future.result()["profile"])
+    if result["status"] == "success":
+        result_key = cache_key or make_job_output_key(job_id)
+        result_store.put(result_key, result)
+        result = {"status": "success", "result_key": result_key}
+    cache.set(make_job_result_key(job_id), {**result, "jobID": job_id})
+    if cache_key is not None:
+        # Only now, so that identical jobs submitted from now on hit the cache.
+        single_flight.release(cache_key, job_id)
+
+
+def get_job_result(job_id):
+    """
+    The stored outcome of a job, or else of the job it follows (see `web.single_flight`).
+
+    A successful outcome only points to the result in the result store; see `result_response`.
+    """
+    result = cache.get(make_job_result_key(job_id))
+    if result is None or "leader" not in result:
+        return result
+    leader_result = cache.get(make_job_result_key(result["leader"]))
+    if leader_result is None:
+        # The leader was rejected, or its result has expired.
+        return {"jobID": job_id, "status": "error"}
+    if leader_result["status"] == "queued":
+        return result
+    return {**leader_result, "jobID": job_id}
+
+
+def wait_for_job_result(job_id):
+    """Wait until a job (or the job it follows) has finished, and return its outcome."""
+    deadline = time.monotonic() + single_flight.timeout
+    result = get_job_result(job_id)
+    while result is not None and result["status"] == "queued":
+        if time.monotonic() > deadline:
+            return {"jobID": job_id, "status": "error"}
+        # Under gevent, sleeping only suspends this greenlet.
+        time.sleep(FOLLOWER_POLL_INTERVAL)
+        result = get_job_result(job_id)
+    return result
+
+
+def result_response(result):
+    """
+    Respond with the outcome of a job, as returned by `get_job_result`.
+
+    Results from the result store are sent as the compressed bytes it holds, if the client accepts gzip, so that
+    Flask-Compress does not compress them again.
+    """
+    if result is None or "result_key" not in result:
+        return jsonify(result)
+    job_id = result["jobID"]
+    if "gzip" in request.accept_encodings:
+        body = result_store.get_gzipped(result["result_key"], job_id)
+        if body is not None:
+            return app.response_class(
+                body,
+                mimetype="application/json",
+                headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"},
+            )
+    else:
+        full_result = result_store.get(result["result_key"], job_id)
+        if full_result is not None:
+            return jsonify(full_result)
+    # The result has been evicted in the meantime.
+    return jsonify(jobID=job_id, status="error")
+
+
+def split_job(data, field, part_size):
+    """
+    Split a job into parts, each with its share of `data[field]` (in order), to be run in parallel.
+
+    Each part gets at least `part_size` items, and there are no more parts than simulation workers. Returns None if
+    the job is not worth splitting, or if `part_size` is 0.
+    """
+    items = data[field]
+    if not part_size:
+        return None
+    parts = min(job_queue.max_workers, job_queue.max_depth, -(-len(items) // part_size))
+    if parts < 2:
+        return None
+    size = -(-len(items) // parts)
+    return [{**data, field: items[i : i + size]} for i in range(0, len(items), size)]
+
+
+def submit_job(data, fn, cache_key=None, arrays_key=None, parts=None, combine=None):
+    """
+    Run `fn(data, redis_url)` on the job queue, and respond with its result.
+
+    By default, the response is sent once the job is done. If the request has `"async": true`, the response is sent
+    right away with status 202, and the result can then be fetched from `/result/<jobID>`.
+    If `cache_key` is given, a successful result is also cached under it, and likewise for the job's `arrays`
+    under `arrays_key`. Jobs with the same `cache_key` as a running job are not run, but follow that job instead:
+    they get its result, and its log messages are streamed to their channels too. Jobs to be profiled never
+    follow other jobs, since they would have nothing to profile.
+    If `parts` are given (see `split_job`), `fn` runs on each of them in parallel, and the job's result is then
+    `combine(results)`, also run on the job queue.
+    """
+    job_id = data["jobID"]
+    logger = logging.getLogger(job_id).getChild("submit_job")
+    redis_url = None
     if is_redis_available:
         logger.info(
-            f"Redis is available. Will stream logs to frontend via Redis channel {data['jobID']}."
+            f"Redis is available. Will stream logs to frontend via Redis channel {job_id}."
         )
-        logging_handler = logging.StreamHandler(stream=RedisJobStream(data["jobID"]))
-        job_logger.addHandler(logging_handler)
-
+        redis_url = app.config["REDIS_URL"]
+    leader = None
+    if cache_key is not None and not data.get("profile"):
+        leader = single_flight.join(cache_key, job_id)
+    if leader is not None:
+        logger.info(f"Identical job {leader} is running; waiting for its result.")
+        metrics.increment("jobs_total", kind=job_kind(fn), status="followed")
+        cache.set(
+            make_job_result_key(job_id),
+            {"jobID": job_id, "status": "queued", "leader": leader},
+        )
+        if data.get("async"):
+            return jsonify(jobID=job_id, status="queued"), 202
+        return result_response(wait_for_job_result(job_id))
+    # Mark the job as queued before submitting it, so that its result can never be overwritten by this marker.
+    cache.set(make_job_result_key(job_id), {"jobID": job_id, "status": "queued"})
     try:
-        temperature = data["temperature"]
-        with open(f"puzzles/{data['puzzle']}.json") as json_file:
-            puzzle_definition = json.load(json_file)
-            logger.info("    Successfully loaded Puzzle Data from file!")
-        plot_combined, plot_individual, score = simulate_experiments_and_plot(
-            data, puzzle_definition, temperature, diag=False
+        on_done = partial(
+            finish_job, job_id, cache_key, kind=job_kind(fn), arrays_key=arrays_key
         )
-        logger.info(
-            f"Executed for {humanize.precisedelta(dt.datetime.now() - start_time)}."
+        if parts is None:
+            future = job_queue.submit(job_id, fn, data, redis_url, on_done=on_done)
+        else:
+            future = job_queue.submit_all(
+                job_id,
+                fn,
+                [(part, redis_url) for part in parts],
+                combine,
+                on_done=on_done,
+            )
+    except QueueFullError as e:
+        logger.warning(f"Rejected jobID {job_id}: {e}")
+        metrics.increment("jobs_total", kind=job_kind(fn), status="busy")
+        cache.delete(make_job_result_key(job_id))
+        if cache_key is not None:
+            single_flight.release(cache_key, job_id)
+        return (
+            jsonify(
+                jobID=job_id,
+                status="busy",
+                message="The server is busy. Please try again in a few seconds.",
+            ),
+            503,
+            {"Retry-After": str(RETRY_AFTER)},
+        )
+    record_queue_depth()
+    if data.get("async"):
+        return jsonify(jobID=job_id, status="queued"), 202
+    # Under gevent, waiting for the result only suspends this greenlet.
+    return jsonify({**get_job_outcome(future), "jobID": job_id})
+
+
+def submit_warming_job(data):
+    """Run a request on behalf of `cache_warmer`, unless an identical job is running already."""
+    job_id = data["jobID"]
+    cache_key = make_plot_cache_key(data)
+    if single_flight.join(cache_key, job_id) is not None:
+        return None
+    try:
+        return job_queue.submit(
+            job_id,
+            run_plot_job,
+            data,
+            app.config["REDIS_URL"] if is_redis_available else None,
+            on_done=partial(finish_job, job_id, cache_key),
         )
-        result = {
-            "status": "success",
-            "plot_individual": plot_individual,
-            "plot_combined": plot_combined,
-            "temperature": temperature,
-            "score": score,
+    except QueueFullError:
+        single_flight.release(cache_key, job_id)
+        return None
+
+
+# Runs the requests players most likely send first, while no player is waiting for a job.
+# Only if `CKWATSON_WARM_CACHE` is set, for all puzzles at startup and for each puzzle once saved.
+WARM_CACHE = os.environ.get("CKWATSON_WARM_CACHE", "").lower() in ("1", "true", "yes")
+cache_warmer = CacheWarmer(
+    puzzle_registry,
+    submit=submit_warming_job,
+    is_warm=lambda data: make_plot_cache_key(data) in result_store,
+    is_idle=lambda: job_queue.depth == 0,
+)
+
+
+@app.route("/plot", methods=["POST", "OPTIONS"])
+def handle_plot_request():
+    """
+    Simulate the puzzle with the proposed reactions and plot the results. See `submit_job` for the protocol.
+
+    With `"mode": "score"`, no plots are drawn (see `web.run_simulation.score_only`).
+    """
+    return plot_or_score(request.get_json())
+
+
+@app.route("/render", methods=["POST"])
+def handle_render_request():
+    """Draw the plots for a request previously sent to `/plot` in score-only mode, reusing its trajectories."""
+    return plot_or_score(
+        {
+            **request.get_json(),
+            "mode": "plot",
+            "trajectories": False,
+            "points": None,
+            "format": None,
         }
-        cache.set(
-            cache_key,
-            result,
+    )
+
+
+def plot_or_score(data):
+    """Serve a `/plot` request from the cache, or else submit it as a job."""
+    job_id = data["jobID"]
+    logger = logging.getLogger(job_id).getChild("handle_plot_request")
+    cache_key = make_plot_cache_key(data)
+    # Admins asking for a profile bypass the cache, which would leave nothing to profile.
+    profile_requested = request.headers.get(PROFILE_HEADER) == AUTH_CODE
+    if cache_key in result_store and not profile_requested:
+        logger.info(f"Cache hit for jobID {job_id} with cache key {cache_key}.")
+        metrics.increment("cache_requests_total", cache="result", outcome="hits")
+        return result_response(
+            {"jobID": job_id, "status": "success", "result_key": cache_key}
         )
-        result["jobID"] = data["jobID"]
-        return jsonify(result)
-    except Exception:
-        logger.error(traceback.format_exc())
-        logger.info(
-            f"Executed for {humanize.precisedelta(dt.datetime.now() - start_time)}."
+    metrics.increment("cache_requests_total", cache="result", outcome="misses")
+    data = {**data, "profile": should_profile(profile_requested)}
+    if data.get("mode") == "score":
+        return submit_job(data, run_plot_job, cache_key, make_arrays_key(data))
+    arrays = cache.get(make_arrays_key(data))
+    if arrays is not None:
+        logger.info("Drawing plots from the trajectories of a score-only job.")
+        data = {**data, "arrays": arrays}
+    return submit_job(data, run_plot_job, cache_key)
+
+
+@app.route("/batch", methods=["POST"])
+def handle_batch_request():
+    """
+    Score many proposed mechanisms against the same puzzle and conditions in one job.
+
+    Instead of `reactions`, the request has `mechanisms`: a list of reaction lists. Plots are only drawn if the
+    request has `"plot": true`. Batches of more than `BATCH_PART_SIZE` mechanisms are split into parts that run in
+    parallel; each part simulates (or reads from the cache) the true model, and its own distinct mechanisms. See
+    `submit_job` for the protocol.
+    """
+    data = request.get_json()
+    mechanisms = data.get("mechanisms")
+    if not isinstance(mechanisms, list) or not mechanisms:
+        message = "`mechanisms` must be a non-empty list."
+    elif len(mechanisms) > MAX_BATCH_SIZE:
+        message = f"Too many mechanisms (>{MAX_BATCH_SIZE})."
+    else:
+        return submit_job(
+            data,
+            run_batch_job,
+            parts=split_job(data, "mechanisms", BATCH_PART_SIZE),
+            combine=partial(combine_batch_jobs, data),
+        )
+    return jsonify(jobID=data["jobID"], status="error", message=message), 400
+
+
+@app.route("/sweep", methods=["POST"])
+def handle_sweep_request():
+    """
+    Simulate one proposed mechanism in a series of experiments, e.g. at a series of temperatures, in one job.
+
+    The request has `sweep`: a list of experiments, each setting its `temperature` and/or `conditions` (see
+    `web.sweeps.sweep_points`). A summary plot is drawn unless the request has `"plot": false`. The experiments are
+    split into parts of at least `SWEEP_PART_SIZE`, which run in parallel. See `submit_job` for the protocol.
+    """
+    data = request.get_json()
+    points = data.get("sweep")
+    if not isinstance(points, list) or not points:
+        message = "`sweep` must be a non-empty list."
+    elif len(points) > MAX_SWEEP_POINTS:
+        message = f"Too many experiments (>{MAX_SWEEP_POINTS})."
+    elif not all(isinstance(point, dict) for point in points):
+        message = "Each experiment of `sweep` must be an object."
+    else:
+        cache_key = make_sweep_cache_key(data)
+        if cache_key in result_store:
+            metrics.increment("cache_requests_total", cache="result", outcome="hits")
+            return result_response(
+                {"jobID": data["jobID"], "status": "success", "result_key": cache_key}
+            )
+        metrics.increment("cache_requests_total", cache="result", outcome="misses")
+        parts = split_job(data, "sweep", SWEEP_PART_SIZE)
+        return submit_job(
+            data,
+            run_sweep_job,
+            cache_key,
+            # The summary plot is drawn once all parts are done.
+            parts=parts and [{**part, "plot": False} for part in parts],
+            combine=partial(combine_sweep_jobs, data),
         )
-        return jsonify(jobID=data["jobID"], status="error")
+    return jsonify(jobID=data["jobID"], status="error", message=message), 400
+
+
+@app.route("/result/<job_id>")
+@limiter.exempt
+def serve_job_result(job_id):
+    """Report the outcome of a submitted job; status 202 means it is still queued or running."""
+    result = get_job_result(job_id)
+    if result is None:
+        return jsonify(jobID=job_id, status="unknown"), 404
+    if result["status"] == "queued":
+        return jsonify(result), 202
+    return result_response(result)
+
+
+@app.route("/profile/<job_id>")
+def serve_job_profile(job_id):
+    """Download the profile of a job, as folded stacks (see `web.profiling.SamplingProfiler`). Admins only."""
+    if request.headers.get(PROFILE_HEADER) != AUTH_CODE:
+        return "Authentication failed.", 403
+    profile = cache.get(make_profile_key(job_id))
+    if profile is None:
+        return "No profile for this job.", 404
+    return app.response_class(
+        profile["folded"],
+        mimetype="text/plain",
+        headers={
+            "Content-Disposition": f'attachment; filename="{job_id}.folded"',
+            "X-Profile-Seconds": str(profile["seconds"]),
+            "X-Profile-Interval": str(profile["interval"]),
+        },
+    )
+
+
+@app.route("/metrics")
+@limiter.exempt
+def serve_metrics():
+    """Expose `metrics` in the Prometheus text format."""
+    record_queue_depth()
+    return app.response_class(
+        metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 @app.route("/save", methods=["POST", "OPTIONS"])
@@ -185,7 +640,7 @@ def handle_save_request():
             status="danger", message="Authentication failed. Check your password."
         )
     # Else, validate with jsonschema:
-    existing_puzzles = all_files_in("puzzles")
+    existing_puzzles = puzzle_registry.names()
     if puzzle_name in existing_puzzles:
         return jsonify(
             status="danger", message="Puzzle already exists. Try another name."
@@ -195,7 +650,12 @@ def handle_save_request():
     except ValidationError as e:
         return jsonify(status="danger", message=e.message)
     else:
-        return save_a_puzzle(data)
+        response = save_a_puzzle(data)
+        if response.get_json()["status"] == "success":
+            puzzle_registry.invalidate(puzzle_name)
+            if WARM_CACHE:
+                cache_warmer.start([puzzle_name])
+        return response
 
 
 @app.route("/create")
@@ -208,22 +668,28 @@ def serve_page_play(puzzle_name):
     # Disallow reading `schema.json` or any hidden files
     if puzzle_name.startswith(".") or puzzle_name == "schema":
         return "Invalid puzzle name.", 400
-    with open(f"puzzles/{puzzle_name}.json") as json_file:
-        puzzle_data = json_file.read()
+    try:
+        puzzle = puzzle_registry.get(puzzle_name)
+    except FileNotFoundError:
+        return "Unknown puzzle.", 404
+    except InvalidPuzzleError as e:
+        logging.getLogger(__name__).warning("Not serving an invalid puzzle: %s", e)
+        return "This puzzle is invalid. Please let an admin know.", 400
     return render_template(
         "play.html",
         puzzle_name=puzzle_name,
-        puzzle_data=puzzle_data,
+        puzzle_data=puzzle.text,
         REDIS_OK=is_redis_available,  # Pass Redis status to template
     )
 
 
 @app.route("/")
 def serve_page_index():
-    puzzle_list = all_files_in("puzzles", end=".json")
-    # Except `schema.json`.
-    puzzle_list = [p for p in puzzle_list if p != "schema"]
-    return render_template("index.html", puzzle_list=puzzle_list)
+    return render_template("index.html", puzzle_list=puzzle_registry.names())
+
+
+if WARM_CACHE:
+    cache_warmer.start()
 
 
 if __name__ == "__main__":
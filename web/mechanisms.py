@@ -0,0 +1,104 @@
+from typing import Iterable, List, Sequence, Set
+
+from web.caching import hash_json
+
+# A proposed reaction is a list of 4 slots, each holding a species name or "": 2 reactants, then 2 products.
+NUM_REACTANT_SLOTS = 2
+
+
+def make_coefficient_array(
+    reactions: Sequence[Sequence[str]], species_list: List[str]
+) -> List[List[int]]:
+    """
+    Turn proposed reactions into a coefficient array, with one row per reaction and one column per species.
+
+    Reactants have a positive coefficient, because they are consumed in the reaction; products have a negative one,
+    because they are produced. Empty slots and unknown species are ignored.
+    """
+    coefficient_array = []
+    for reaction in reactions:
+        row = [0] * len(species_list)
+        for slot_id, species in enumerate(reaction):
+            if species in species_list:
+                row[species_list.index(species)] += (
+                    1 if slot_id < NUM_REACTANT_SLOTS else -1
+                )
+        coefficient_array.append(row)
+    return coefficient_array
+
+
+def canonicalize_coefficient_array(
+    coefficient_array: Sequence[Sequence[int]],
+) -> List[List[int]]:
+    """
+    The canonical form of a mechanism: its non-zero reactions, in a fixed order.
+
+    Reactions that change nothing (e.g. A + B -> A + B) add nothing to a mechanism, and the order in which reactions
+    are listed does not matter. A repeated reaction is kept as many times as it is listed, though, since the kernel
+    simulates each copy, which multiplies its rate. A reaction and its reverse are kept apart too, since the direction
+    a reaction is written in is part of what the user proposed.
+    """
+    rows = [tuple(int(c) for c in row) for row in coefficient_array if any(row)]
+    return [list(row) for row in sorted(rows)]
+
+
+def mechanism_fingerprint(
+    reactions: Sequence[Sequence[str]], species_list: List[str]
+) -> str:
+    """A digest that is the same for all equivalent ways of writing a mechanism (see `canonicalize_coefficient_array`)."""
+    return hash_json(
+        canonicalize_coefficient_array(make_coefficient_array(reactions, species_list))
+    )
+
+
+def reactions_from_coefficient_array(
+    coefficient_array: Sequence[Sequence[int]], species_list: List[str]
+) -> List[List[str]]:
+    """
+    Write the coefficient array of a stored puzzle as proposed reactions, the way the play page would submit them.
+
+    Stored puzzles follow the sign convention of `web.save_a_puzzle.convert_reactions_to_coefficients`: reactants
+    are negative and products positive, the opposite of `make_coefficient_array`. Reactions with more than 2
+    reactants or products do not fit in the 4 slots, and are left out.
+    """
+    reactions = []
+    for row in coefficient_array:
+        reactants, products = [], []
+        for species, coefficient in zip(species_list, row):
+            side = reactants if coefficient < 0 else products
+            side += [species] * abs(int(coefficient))
+        if len(reactants) > NUM_REACTANT_SLOTS or len(products) > NUM_REACTANT_SLOTS:
+            continue
+        reactions.append(
+            (reactants + [""] * NUM_REACTANT_SLOTS)[:NUM_REACTANT_SLOTS]
+            + (products + [""] * NUM_REACTANT_SLOTS)[:NUM_REACTANT_SLOTS]
+        )
+    return reactions
+
+
+def reachable_species(
+    coefficient_array: Sequence[Sequence[int]], seeds: Iterable[int]
+) -> Set[int]:
+    """
+    The (column indices of the) species that can ever be present, if only the `seeds` are present at first.
+
+    Reactions are reversible, so a reaction can run as soon as either all its reactants or all its products are
+    present, and then makes the other side present too (a side with no species at all is always "present", as its
+    mass-action rate is a constant). Catalysts have a coefficient of 0, so they never hold a reaction back, just as
+    they don't appear in its mass-action rate.
+    """
+    present = set(seeds)
+    sides = []
+    for row in coefficient_array:
+        reactants = {i for i, c in enumerate(row) if c > 0}
+        products = {i for i, c in enumerate(row) if c < 0}
+        sides.append((reactants, products))
+    changed = True
+    while changed:
+        changed = False
+        for reactants, products in sides:
+            if reactants <= present or products <= present:
+                if not (reactants | products) <= present:
+                    present |= reactants | products
+                    changed = True
+    return present
@@ -0,0 +1,181 @@
+import logging
+import re
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the buckets of every histogram, in seconds.
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+# The `le` label of a histogram bucket, with the comma that follows it, if any.
+_LE_LABEL = re.compile(r'(?:^|(?<=,))le="([^"]*)",?')
+
+# The stage timings of the jobs running in this process; see `stage_timings`.
+_active_timings: List[Dict[str, float]] = []
+
+
+@contextmanager
+def stage_timings():
+    """Collect how long each `timed` stage takes while active, as a dict from stage names to seconds."""
+    timings: Dict[str, float] = {}
+    _active_timings.append(timings)
+    try:
+        yield timings
+    finally:
+        _active_timings.remove(timings)
+
+
+@contextmanager
+def timed(stage: str):
+    """Time a stage of a job, adding up its durations if it runs more than once. Costs nothing outside a job."""
+    if not _active_timings:
+        yield
+        return
+    timings = _active_timings[-1]
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+def _sort_key(key: str) -> Tuple[str, str, float]:
+    """
+    Order samples by their labels, then by name, and the buckets of a histogram by their bounds.
+
+    Sorting the keys as strings would put `le="+Inf"` first, and `le="10.0"` before `le="2.5"`.
+    """
+    name, _, labels = key.partition("{")
+    match = _LE_LABEL.search(labels)
+    if match is None:
+        return labels, name, 0.0
+    # `float` reads "+Inf" too.
+    return _LE_LABEL.sub("", labels), name, float(match.group(1))
+
+
+class Metrics:
+    """
+    Counters, gauges and histograms, exposed in the Prometheus text format by `render`.
+
+    If `redis_url` is given, samples are kept in a Redis hash, so that every web worker adds to (and exposes) the
+    same values; otherwise, they are kept in this process. Gauges set with a `ttl` are kept in Redis keys of their
+    own, which expire unless set again in time.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None, prefix: str = "ckwatson"):
+        self.redis = redis.Redis.from_url(redis_url) if redis_url else None
+        self.prefix = prefix
+        self._types: Dict[str, Tuple[str, str]] = {}
+        self._samples: Dict[str, float] = {}
+        # Samples set with a `ttl`, with the `time.monotonic()` at which they expire.
+        self._expiring: Dict[str, Tuple[float, float]] = {}
+
+    def declare(self, name: str, kind: str, help_text: str):
+        """Declare a metric (`kind` being "counter", "gauge" or "histogram") before recording samples of it."""
+        self._types[f"{self.prefix}_{name}"] = (kind, help_text)
+
+    def _update(
+        self, increments: Dict[str, float], values: Optional[Dict[str, float]] = None
+    ):
+        values = values or {}
+        if self.redis is None:
+            for key, amount in increments.items():
+                self._samples[key] = self._samples.get(key, 0.0) + amount
+            self._samples.update(values)
+            return
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            for key, amount in increments.items():
+                pipeline.hincrbyfloat(f"{self.prefix}:metrics", key, amount)
+            if values:
+                pipeline.hset(f"{self.prefix}:metrics", mapping=values)
+            pipeline.execute()
+        except redis.RedisError as e:
+            logger.warning("Failed recording metrics: %r", e)
+
+    def increment(self, name: str, amount: float = 1, **labels: str):
+        self._update({f"{self.prefix}_{name}{_labels(labels)}": amount})
+
+    def set(self, name: str, value: float, ttl: Optional[float] = None, **labels: str):
+        """
+        Set a gauge. With `ttl`, the sample disappears unless it is set again within `ttl` seconds.
+
+        That is for samples of a process (e.g. labelled with its PID), which would otherwise outlive the process.
+        """
+        key = f"{self.prefix}_{name}{_labels(labels)}"
+        if ttl is None:
+            self._update({}, {key: value})
+        elif self.redis is None:
+            self._expiring[key] = (value, time.monotonic() + ttl)
+        else:
+            try:
+                self.redis.set(
+                    f"{self.prefix}:metrics:{key}", value, px=max(1, int(ttl * 1000))
+                )
+            except redis.RedisError as e:
+                logger.warning("Failed recording metrics: %r", e)
+
+    def observe(self, name: str, value: float, **labels: str):
+        """Add a sample to a histogram."""
+        full_name = f"{self.prefix}_{name}"
+        increments = {
+            f"{full_name}_sum{_labels(labels)}": value,
+            f"{full_name}_count{_labels(labels)}": 1,
+        }
+        # Every bucket is incremented, by 0 if need be, so that they all exist from the first sample on.
+        for bound in BUCKETS:
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            increments[f"{full_name}_bucket{_labels({**labels, 'le': le})}"] = int(
+                value <= bound
+            )
+        self._update(increments)
+
+    def samples(self) -> Dict[str, float]:
+        if self.redis is None:
+            now = time.monotonic()
+            for key, (_, expiry) in list(self._expiring.items()):
+                if expiry <= now:
+                    del self._expiring[key]
+            return {
+                **self._samples,
+                **{key: value for key, (value, _) in self._expiring.items()},
+            }
+        try:
+            samples = {
+                key.decode(): float(value)
+                for key, value in self.redis.hgetall(f"{self.prefix}:metrics").items()
+            }
+            expiring_keys = list(self.redis.scan_iter(f"{self.prefix}:metrics:*"))
+            if expiring_keys:
+                prefix_length = len(f"{self.prefix}:metrics:")
+                for key, value in zip(expiring_keys, self.redis.mget(expiring_keys)):
+                    # The key may have expired since it was listed.
+                    if value is not None:
+                        samples[key.decode()[prefix_length:]] = float(value)
+            return samples
+        except redis.RedisError as e:
+            logger.warning("Failed reading metrics: %r", e)
+            return {}
+
+    def render(self) -> str:
+        """All samples, in the Prometheus text exposition format."""
+        samples = self.samples()
+        lines = []
+        for name, (kind, help_text) in sorted(self._types.items()):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            suffixes = ("_bucket", "_sum", "_count") if kind == "histogram" else ("",)
+            for key in sorted(samples, key=_sort_key):
+                base = key.split("{", 1)[0]
+                if any(base == name + suffix for suffix in suffixes):
+                    lines.append(f"{key} {samples[key]!r}")
+        return "\n".join(lines) + "\n"
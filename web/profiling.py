@@ -0,0 +1,94 @@
+import functools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+# The fraction of `/plot` jobs that are profiled, even if nobody asked for it.
+PROFILE_SAMPLE_RATE = float(os.environ.get("CKWATSON_PROFILE_SAMPLE_RATE", 0))
+# How often a profiled job's call stack is sampled, in seconds.
+PROFILE_INTERVAL = float(os.environ.get("CKWATSON_PROFILE_INTERVAL", 0.005))
+
+
+def should_profile(requested: bool) -> bool:
+    """Whether to profile a job: an admin asked for it, or it is one of the `PROFILE_SAMPLE_RATE` sampled jobs."""
+    return requested or random.random() < PROFILE_SAMPLE_RATE
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+class SamplingProfiler:
+    """
+    Samples the call stack of the thread that starts it, from a background thread, every `interval` seconds.
+
+    Sampling rather than tracing every call keeps the job's own overhead low, whatever it calls. `folded` gives the
+    samples in the "folded stacks" format read by flamegraph.pl, speedscope and most other flame graph viewers.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._thread_id: Optional[int] = None
+        self._stopped = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._sampler = threading.Thread(target=self._run, daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+
+
+def profile_job(job):
+    """
+    Profile a job if its request has `"profile": true`, adding the folded stacks to its result as `profile`.
+
+    The web process takes the profile out of the result, and keeps it for download from `/profile/<jobID>`.
+    Other jobs are run as they are.
+    """
+
+    @functools.wraps(job)
+    def wrapper(data: Dict, redis_url: Optional[str] = None) -> Dict:
+        if not data.get("profile"):
+            return job(data, redis_url)
+        profiler = SamplingProfiler()
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            result = job(data, redis_url)
+        finally:
+            profiler.stop()
+        result["profile"] = {
+            "seconds": time.perf_counter() - start,
+            "interval": profiler.interval,
+            "folded": profiler.folded(),
+        }
+        return result
+
+    return wrapper
@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from web.caching import hash_json
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidPuzzleError(ValueError):
+    """Raised when a puzzle file is not valid JSON, or does not describe a consistent puzzle."""
+
+
+def validate_puzzle_definition(definition: Dict[str, Any]) -> List[str]:
+    """Check the internal consistency of a puzzle as stored on disk (see `save_a_puzzle`)."""
+    errors = []
+    for key in ("coefficient_dict", "energy_dict", "coefficient_array", "reagentPERs"):
+        if key not in definition:
+            errors.append(f"Missing '{key}'.")
+    if errors:
+        return errors
+    coefficient_dict = definition["coefficient_dict"]
+    num_species = len(coefficient_dict)
+    if sorted(coefficient_dict.values()) != list(range(num_species)):
+        errors.append("coefficient_dict must map species to indices 0..n-1.")
+    if set(definition["energy_dict"]) != set(coefficient_dict):
+        errors.append("energy_dict must have exactly one energy per species.")
+    num_reactions = len(definition["coefficient_array"])
+    for idx, reaction in enumerate(definition["coefficient_array"]):
+        if len(reaction) != num_species:
+            errors.append(
+                f"Reaction #{idx} has {len(reaction)} coefficients, expected {num_species}."
+            )
+    for reagent, toggles in definition["reagentPERs"].items():
+        if reagent not in coefficient_dict:
+            errors.append(f"Reagent '{reagent}' is not a species.")
+        if len(toggles) != num_reactions:
+            errors.append(
+                f"Reagent '{reagent}' PER toggles length {len(toggles)} != number of reactions {num_reactions}."
+            )
+    return errors
+
+
+@dataclass
+class PuzzleEntry:
+    """A puzzle file, parsed and validated once, together with the data derived from it."""
+
+    name: str
+    # The raw content of the file, as served to the play page.
+    text: str
+    definition: Dict[str, Any]
+    # A digest of `definition`, used to key caches of anything derived from this puzzle.
+    content_hash: str
+    # Species names, ordered by their indices in the coefficient array.
+    species_list: List[str]
+    coefficient_array: np.ndarray
+    # Identifies the version of the file this entry was built from.
+    stat_signature: Optional[Tuple[int, int]] = None
+    # The `puzzle_class.puzzle` instance, built by `web.run_simulation` the first time it is needed. Jobs simulate
+    # copies of it, never the instance itself.
+    puzzle: Optional[Any] = field(default=None, repr=False)
+
+    @classmethod
+    def from_definition(
+        cls, name: str, definition: Dict[str, Any], text: Optional[str] = None
+    ) -> "PuzzleEntry":
+        """Validate a puzzle definition and derive everything else from it."""
+        errors = validate_puzzle_definition(definition)
+        if errors:
+            raise InvalidPuzzleError(f"Puzzle '{name}': " + "; ".join(errors))
+        coefficient_dict = definition["coefficient_dict"]
+        return cls(
+            name=name,
+            text=json.dumps(definition) if text is None else text,
+            definition=definition,
+            content_hash=hash_json(definition),
+            species_list=sorted(coefficient_dict, key=coefficient_dict.get),
+            coefficient_array=np.array(definition["coefficient_array"], dtype=float),
+        )
+
+
+class PuzzleRegistry:
+    """
+    A process-wide, in-memory registry of the puzzles in a directory.
+
+    Each puzzle file is read, parsed and validated only once, and again only after the file has changed on disk.
+    The list of puzzles is likewise only rescanned after the directory has changed.
+    """
+
+    def __init__(self, directory: str = "puzzles"):
+        # Kept relative, and resolved at call time (supports changed CWD in tests), like `save_a_puzzle` does.
+        self.directory = directory
+        self._entries: Dict[Path, PuzzleEntry] = {}
+        self._names: Dict[Path, Tuple[int, List[str]]] = {}
+        self._lock = Lock()
+
+    def _path_of(self, name: str) -> Path:
+        # Disallow reading `schema.json` or any hidden files
+        if name.startswith(".") or name == "schema" or os.sep in name:
+            raise FileNotFoundError(f"Invalid puzzle name: {name!r}")
+        return (Path(self.directory) / f"{name}.json").resolve()
+
+    def names(self) -> List[str]:
+        """The names of all puzzles, except `schema.json`."""
+        directory = Path(self.directory).resolve()
+        mtime = directory.stat().st_mtime_ns
+        cached = self._names.get(directory)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        names = sorted(
+            p.stem
+            for p in directory.iterdir()
+            if p.is_file()
+            and not p.name.startswith(".")
+            and p.name.endswith(".json")
+            and p.stem != "schema"
+        )
+        self._names[directory] = (mtime, names)
+        return names
+
+    def get(self, name: str) -> PuzzleEntry:
+        """
+        Return the registry entry of a puzzle, (re)loading it from disk if needed.
+
+        Raises `FileNotFoundError` for unknown puzzles and `InvalidPuzzleError` for inconsistent ones.
+        """
+        path = self._path_of(name)
+        stat = path.stat()
+        stat_signature = (stat.st_mtime_ns, stat.st_size)
+        entry = self._entries.get(path)
+        if entry is not None and entry.stat_signature == stat_signature:
+            return entry
+        with self._lock:
+            entry = self._load(name, path, stat_signature)
+            self._entries[path] = entry
+        return entry
+
+    def _load(
+        self, name: str, path: Path, stat_signature: Tuple[int, int]
+    ) -> PuzzleEntry:
+        logger.info("Loading puzzle %r from %s.", name, path)
+        try:
+            text = path.read_text()
+            definition = json.loads(text)
+        except (UnicodeDecodeError, ValueError) as e:
+            # `json.JSONDecodeError` is a `ValueError`.
+            raise InvalidPuzzleError(f"Puzzle '{name}': not valid JSON ({e})") from e
+        entry = PuzzleEntry.from_definition(name, definition, text=text)
+        entry.stat_signature = stat_signature
+        return entry
+
+    def invalidate(self, name: Optional[str] = None):
+        """Forget a puzzle (or all of them, if `name` is None), e.g. after its file has been written."""
+        with self._lock:
+            self._names.clear()
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self._path_of(name), None)
+
+
+# The registry shared by everything in this process.
+registry = PuzzleRegistry()
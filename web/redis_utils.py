@@ -1,9 +1,13 @@
+import json
+import logging
 import os
 import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
 
 import redis
-from flask import current_app
-from flask_sse import sse
 
 
 def redis_available(url):
@@ -15,29 +19,175 @@ def redis_available(url):
         return False
 
 
+# How long the log of a job is kept, so that jobs joining it later on can catch up (see `web.single_flight`).
+JOB_LOG_TIMEOUT = 3600
+
+
+def sse_message(s: str) -> str:
+    """Format a log message the same way `flask_sse.sse.publish` would, but without requiring a Flask app context."""
+    # The outer dict is the serialized `flask_sse.Message`; the inner one is what the frontend parses.
+    return json.dumps({"data": {"data": s}})
+
+
+def job_log_key(job_id: str) -> str:
+    """The Redis list holding all log messages streamed so far for a job."""
+    return f"job_log:{job_id}"
+
+
+def job_followers_key(job_id: str) -> str:
+    """The Redis set of the jobs waiting on the outcome of a job, whose channels receive its log messages too."""
+    return f"job_followers:{job_id}"
+
+
 class RedisJobStream:
-    """Streams log messages to a Redis-backed SSE channel for a specific job."""
+    """Streams log messages to a Redis-backed SSE channel for a specific job, and to those of its followers.
+
+    Messages are published in the same format as `flask_sse.sse.publish` would, but without requiring a Flask app
+    context, so that this stream also works inside the simulation worker processes.
 
-    def __init__(self, job_id):
+    Writing only appends to a buffer. A background thread publishes what has been buffered every `flush_interval`
+    seconds (or as soon as `max_batch_chars` are buffered), merged into as few messages as possible, in one round trip.
+    It starts doing so once someone subscribes to the channel, or after `subscriber_grace` seconds, so that the first
+    messages of a job are not lost while its page is still connecting. If more than `max_buffer_chars` are waiting,
+    further messages are dropped, and replaced by a note saying how many. `close` publishes everything that has been
+    buffered, without waiting for subscribers any longer; `stream_job_logs` waits (at most `close_timeout` seconds)
+    for that final batch before the job returns, so that its last messages reach the page before its result does.
+    """
+
+    def __init__(
+        self,
+        job_id,
+        redis_url,
+        flush_interval: float = 0.1,
+        max_batch_chars: int = 2**16,
+        max_buffer_chars: int = 2**20,
+        subscriber_grace: float = 2.0,
+        close_timeout: float = 5.0,
+    ):
         self.job_id = job_id
+        self.redis = redis.Redis.from_url(redis_url)
+        self.flush_interval = flush_interval
+        self.max_batch_chars = max_batch_chars
+        self.max_buffer_chars = max_buffer_chars
+        self.subscriber_grace = subscriber_grace
+        self.close_timeout = close_timeout
+        self._buffer: List[str] = []
+        self._buffered_chars = 0
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
 
     def write(self, *args):
         s = ""
         for arg in args:
             s += " " + str(arg)
-        with current_app.app_context():
-            try:
-                sse.publish({"data": s}, channel=self.job_id)
-            except AttributeError:
-                try:
-                    sys.stdout.write(" * Orphaned Message: " + s)
-                except Exception:
-                    pass
+        with self._lock:
+            if self._buffered_chars + len(s) > self.max_buffer_chars:
+                self._dropped += 1
+                return
+            self._buffer.append(s)
+            self._buffered_chars += len(s)
+            if self._buffered_chars >= self.max_batch_chars:
+                self._wake.set()
 
     def flush(self):
-        # This method is required for stream-like objects but is intentionally left empty.
+        # Called after every record by `logging.StreamHandler`; publishing is left to the background thread.
         pass
 
+    def has_subscribers(self) -> bool:
+        """Whether anyone (e.g. the job's page) is listening to this job's channel."""
+        try:
+            return self.redis.pubsub_numsub(self.job_id)[0][1] > 0
+        except redis.RedisError:
+            return False
+
+    def close(self, wait: bool = False):
+        """
+        Stop accepting messages. Those buffered are still published, in the background unless `wait`.
+
+        If `wait`, return once they are published, or after `close_timeout` seconds (e.g. if Redis is unreachable).
+        """
+        self._closed.set()
+        self._wake.set()
+        if wait:
+            self._thread.join(self.close_timeout)
+
+    def _take_batches(self) -> List[str]:
+        """Empty the buffer, merging its messages into batches of about `max_batch_chars`."""
+        with self._lock:
+            messages, self._buffer, self._buffered_chars = self._buffer, [], 0
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            messages.append(f" * {dropped} log messages were dropped.\n")
+        batches, batch, batch_chars = [], [], 0
+        for message in messages:
+            if batch and batch_chars + len(message) > self.max_batch_chars:
+                batches.append("".join(batch))
+                batch, batch_chars = [], 0
+            batch.append(message)
+            batch_chars += len(message)
+        if batch:
+            batches.append("".join(batch))
+        return batches
+
+    def _publish(self, batches: List[str]):
+        if not batches:
+            return
+        try:
+            followers = self.redis.smembers(job_followers_key(self.job_id))
+            pipeline = self.redis.pipeline(transaction=False)
+            for batch in batches:
+                message = sse_message(batch)
+                pipeline.rpush(job_log_key(self.job_id), message)
+                for channel in [self.job_id, *followers]:
+                    pipeline.publish(channel, message)
+            pipeline.expire(job_log_key(self.job_id), JOB_LOG_TIMEOUT)
+            pipeline.execute()
+        except redis.RedisError:
+            try:
+                sys.stdout.write(" * Orphaned Message: " + "".join(batches))
+            except Exception:
+                pass
+
+    def _run(self):
+        deadline = time.monotonic() + self.subscriber_grace
+        # Once closed, the job is done and its result is on its way, so subscribers are not waited for any longer.
+        while time.monotonic() < deadline and not self.has_subscribers():
+            if self._closed.wait(self.flush_interval):
+                break
+        while True:
+            # Checked before taking the last batches, so that nothing written before `close` is left behind.
+            closed = self._closed.is_set()
+            self._publish(self._take_batches())
+            if closed:
+                return
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+
+
+@contextmanager
+def stream_job_logs(job_id: str, redis_url: Optional[str]):
+    """
+    While active, stream the log messages of a job to the Redis channel named after it (if `redis_url` is given).
+
+    Yields the `RedisJobStream`, or None if there is none.
+    """
+    if not redis_url:
+        yield None
+        return
+    stream = RedisJobStream(job_id, redis_url)
+    job_logger = logging.getLogger(job_id)
+    logging_handler = logging.StreamHandler(stream=stream)
+    job_logger.addHandler(logging_handler)
+    try:
+        yield stream
+    finally:
+        job_logger.removeHandler(logging_handler)
+        stream.close(wait=True)
+
 
 def get_redis_url():
 
@@ -0,0 +1,109 @@
+import json
+import logging
+import struct
+import zlib
+from typing import Dict, Optional
+
+import redis
+
+from web.caching import BytesLRUCache
+
+logger = logging.getLogger(__name__)
+
+# A gzip member header without file name or modification time (RFC 1952).
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+# Each entry starts with the CRC-32 and length of the JSON it holds, which the gzip trailer needs.
+ENTRY_HEADER = struct.Struct("<II")
+
+
+def _deflate(data: bytes, final: bool, level: int) -> bytes:
+    """Compress `data` into raw deflate blocks; unless `final`, the stream is left open, on a byte boundary."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(
+        zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+    )
+
+
+def _job_id_suffix(job_id: str) -> bytes:
+    return f', "jobID": {json.dumps(job_id)}}}'.encode()
+
+
+class ResultStore:
+    """
+    Keeps job results compressed, in a size-bounded in-process cache in front of Redis (if `redis_url` is given).
+
+    Results are the same for every job asking for the same thing, except for their `jobID`. So, each result is stored
+    as its JSON without the closing brace, compressed into an unfinished deflate stream. Serving it to a job only
+    takes compressing `, "jobID": ...}` and appending that to the stored bytes, with a gzip header and trailer; the
+    bulk of the result, e.g. its SVG plots, is never compressed again.
+    """
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        max_bytes: int = 64 * 2**20,
+        timeout: int = 3600,
+        level: int = 6,
+    ):
+        self.redis = redis.Redis.from_url(redis_url) if redis_url else None
+        self.local = BytesLRUCache(max_bytes)
+        self.timeout = timeout
+        self.level = level
+
+    def _shared_key(self, key: str) -> str:
+        return f"ckwatson:result:{key}"
+
+    def put(self, key: str, result: Dict):
+        """Store a result, which must be a non-empty dict without a `jobID`."""
+        body = json.dumps(result).encode()[:-1]
+        entry = ENTRY_HEADER.pack(zlib.crc32(body), len(body)) + _deflate(
+            body, final=False, level=self.level
+        )
+        self.local.set(key, entry)
+        if self.redis is not None:
+            try:
+                self.redis.set(self._shared_key(key), entry, ex=self.timeout)
+            except redis.RedisError as e:
+                logger.warning("Failed writing %s to the result store: %r", key, e)
+
+    def _get_entry(self, key: str) -> Optional[bytes]:
+        entry = self.local.get(key)
+        if entry is None and self.redis is not None:
+            try:
+                entry = self.redis.get(self._shared_key(key))
+            except redis.RedisError as e:
+                logger.warning("Failed reading %s from the result store: %r", key, e)
+            if entry is not None:
+                self.local.set(key, entry)
+        return entry
+
+    def __contains__(self, key: str) -> bool:
+        return self._get_entry(key) is not None
+
+    def get(self, key: str, job_id: str) -> Optional[Dict]:
+        """The result stored under `key`, as sent to the job `job_id`; or None."""
+        entry = self._get_entry(key)
+        if entry is None:
+            return None
+        body = zlib.decompressobj(-zlib.MAX_WBITS).decompress(
+            entry[ENTRY_HEADER.size :]
+        )
+        return json.loads(body + _job_id_suffix(job_id))
+
+    def get_gzipped(self, key: str, job_id: str) -> Optional[bytes]:
+        """Like `get`, but as gzip-compressed JSON, ready to be sent with `Content-Encoding: gzip`."""
+        entry = self._get_entry(key)
+        if entry is None:
+            return None
+        crc, length = ENTRY_HEADER.unpack_from(entry)
+        suffix = _job_id_suffix(job_id)
+        return b"".join(
+            [
+                GZIP_HEADER,
+                entry[ENTRY_HEADER.size :],
+                _deflate(suffix, final=True, level=self.level),
+                struct.pack(
+                    "<II", zlib.crc32(suffix, crc), (length + len(suffix)) % 2**32
+                ),
+            ]
+        )
@@ -1,8 +1,14 @@
+import copy
+import datetime as dt
 import logging
-from typing import Dict, List, Optional, Tuple
+import os
+import time
+import traceback
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
 
+import humanize
 import numpy as np
-from gevent import sleep
 from numpy._typing import NDArray
 from tabulate import tabulate
 
@@ -14,6 +20,72 @@ from kernel.data import (
 )
 from kernel.engine import align, plotter
 from kernel.engine.driver import run_proposed_experiment, run_true_experiment
+from web.caching import TieredCache, decode_array, encode_array, hash_json
+from web.log_utils import diagnostics_enabled, job_diagnostics
+from web.mechanisms import (
+    canonicalize_coefficient_array,
+    make_coefficient_array,
+    mechanism_fingerprint,
+    reachable_species,
+)
+from web.metrics import stage_timings, timed
+from web.profiling import profile_job
+from web.puzzle_registry import PuzzleEntry
+from web.puzzle_registry import registry as puzzle_registry
+from web.redis_utils import RedisJobStream, stream_job_logs
+from web.sweeps import draw_sweep_plot, equilibrium_composition, sweep_points
+from web.trajectories import (
+    alignment_statistics,
+    downsample,
+    simplify,
+    trajectories_to_columns,
+    trajectories_to_json,
+)
+
+# How many time steps to keep in each trajectory sent to clients, unless they ask otherwise.
+DEFAULT_TRAJECTORY_POINTS = 200
+# Plots never need more time steps than they have pixels across, however many steps the integrator took.
+PLOT_POINTS = int(os.environ.get("CKWATSON_PLOT_POINTS", 1000))
+# How far (as a fraction of each species' range) trajectories may be simplified before scoring; 0 keeps every step.
+SCORE_TOLERANCE = float(os.environ.get("CKWATSON_SCORE_TOLERANCE", 0))
+
+# The true model's trajectory does not depend on what the user proposed, so it is cached separately from the plots.
+true_data_cache = TieredCache(
+    "true_data",
+    maxsize=int(os.environ.get("CKWATSON_TRUE_DATA_CACHE_SIZE", 128)),
+    encode=encode_array,
+    decode=decode_array,
+)
+
+
+def make_true_data_cache_key(
+    puzzle_hash: str, temperature: float, conditions: List[Dict]
+) -> str:
+    """Key the true model's trajectory by everything it depends on: the puzzle's content, temperature and conditions."""
+    return hash_json(
+        {
+            "puzzle": puzzle_hash,
+            "temperature": temperature,
+            # The order in which reactants are listed does not matter.
+            "conditions": sorted(
+                [reactant["name"], reactant["amount"], reactant["temperature"]]
+                for reactant in conditions
+            ),
+        }
+    )
+
+
+def align_trajectories(
+    true_data: np.ndarray, user_data: np.ndarray, tolerance: Optional[float] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Align both trajectories for scoring, after simplifying them within `tolerance` (default: `SCORE_TOLERANCE`)."""
+    if tolerance is None:
+        tolerance = SCORE_TOLERANCE
+    with timed("alignment"):
+        if tolerance > 0:
+            true_data = simplify(true_data, tolerance)
+            user_data = simplify(user_data, tolerance)
+        return align.align_for_scoring(true_data, user_data)
 
 
 def score_user_answer(true_data: np.ndarray, user_data: np.ndarray) -> float:
@@ -21,76 +93,586 @@ def score_user_answer(true_data: np.ndarray, user_data: np.ndarray) -> float:
     Compare user_data to true_data and return a score as a percentage (100 = perfect match).
     The score is 100 * (1 - (sum(abs(true-user)) / sum(abs(true))))
     """
-    true_aligned, user_aligned = align.align_for_scoring(true_data, user_data)
-    # Only compare concentrations, not time (assume first row is time)
-    diff = np.abs(true_aligned[1:] - user_aligned[1:])
-    denom = np.abs(true_aligned[1:]).sum()
+    return score_aligned(*align_trajectories(true_data, user_data))
+
+
+def score_aligned(true_aligned: np.ndarray, user_aligned: np.ndarray) -> float:
+    """Like `score_user_answer`, for trajectories that `align_trajectories` has aligned already."""
+    with timed("scoring"):
+        # Only compare concentrations, not time (assume first row is time)
+        diff = np.abs(true_aligned[1:] - user_aligned[1:]).sum()
+        denom = np.abs(true_aligned[1:]).sum()
     if denom == 0:
         return 0.0
-    score = 1.0 - (diff.sum() / denom)
+    score = 1.0 - (diff / denom)
     return max(0.0, min(1.0, score)) * 100
 
 
+def wants_diagnostics(data: Dict, stream: Optional[RedisJobStream]) -> bool:
+    """Whether anyone will read the expensive diagnostics of a job: it asks for them, or someone follows its logs."""
+    return bool(data.get("verbose")) or (
+        stream is not None and stream.has_subscribers()
+    )
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """The hit and miss counts of this process' caches, so far."""
+    return {cache.namespace: dict(cache.stats) for cache in (true_data_cache,)}
+
+
+def run_job(
+    kind: str,
+    data: Dict,
+    redis_url: Optional[str],
+    body: Callable[[Dict, PuzzleEntry], Dict],
+) -> Dict:
+    """
+    Load the requested puzzle and run the `body` of a `kind` job on it, as one of the `run_*_job` functions.
+
+    This streams the job's log messages, turns on its diagnostics if anyone will read them, and turns any exception
+    into an error result. It also adds to the result how long each of its stages took (`timings`) and how its caches
+    fared (`cache_stats`), which the web process takes out of the result and records as metrics (see `web.metrics`).
+    """
+    before = cache_stats()
+    start = time.perf_counter()
+    start_time = dt.datetime.now()
+    logger = logging.getLogger(data["jobID"]).getChild(f"run_{kind}_job")
+    with (
+        stage_timings() as timings,
+        stream_job_logs(data["jobID"], redis_url) as stream,
+        job_diagnostics(data["jobID"], wants_diagnostics(data, stream)),
+    ):
+        try:
+            with timed("puzzle_loading"):
+                puzzle = puzzle_registry.get(data["puzzle"])
+            logger.info("    Successfully loaded Puzzle Data!")
+            result = body(data, puzzle)
+        except Exception:
+            logger.error(traceback.format_exc())
+            result = {"status": "error"}
+        finally:
+            logger.info(
+                f"Executed for {humanize.precisedelta(dt.datetime.now() - start_time)}."
+            )
+    timings["total"] = time.perf_counter() - start
+    result["timings"] = timings
+    result["cache_stats"] = {
+        namespace: {
+            outcome: count - before[namespace][outcome]
+            for outcome, count in stats.items()
+        }
+        for namespace, stats in cache_stats().items()
+    }
+    return result
+
+
+@profile_job
+def run_plot_job(data: Dict, redis_url: Optional[str] = None) -> Dict:
+    """
+    Load the requested puzzle, simulate it and draw plots, all for one `/plot` job.
+
+    This runs inside a simulation worker process (see `web.job_queue`), so it only takes picklable arguments.
+    If `redis_url` is given, the log messages of this job are streamed to the Redis channel named after its job ID.
+    """
+    return run_job("plot", data, redis_url, plot_job)
+
+
+def plot_job(data: Dict, puzzle: PuzzleEntry) -> Dict:
+    """The body of `run_plot_job`."""
+    temperature = data["temperature"]
+    if data.get("mode") == "score":
+        return score_only(data, puzzle, temperature)
+    if "arrays" in data:
+        # Render a previous score-only job's trajectories instead of simulating again.
+        true_data = decode_array(data["arrays"]["true_data"])
+        user_data = data["arrays"]["user_data"]
+        if user_data is not None:
+            user_data = decode_array(user_data)
+        score = data["arrays"]["score"]
+        plot_individual, plot_combined = draw_plots(
+            data["jobID"], puzzle, true_data, user_data
+        )
+    else:
+        plot_combined, plot_individual, score = simulate_experiments_and_plot(
+            data, puzzle, temperature, diag=False
+        )
+    return {
+        "status": "success",
+        "plot_individual": plot_individual,
+        "plot_combined": plot_combined,
+        "temperature": temperature,
+        "score": score,
+    }
+
+
+def score_only(data: Dict, puzzle: PuzzleEntry, temperature: float) -> Dict:
+    """
+    Simulate and score without touching matplotlib, for a `/plot` job with `"mode": "score"`.
+
+    The result includes alignment statistics and, if the job asks for `"trajectories": true`, both trajectories
+    downsampled to `"points"` time steps (as float32 columns if it asks for `"format": "float32"`). Both full
+    trajectories are also returned as `arrays`, which the web process keeps aside (instead of sending them) so that
+    the plots can be drawn later on, via `/render`.
+    """
+    true_data, user_data, score = simulate_experiments(data, puzzle, temperature)
+    result: Dict = {
+        "status": "success",
+        "temperature": temperature,
+        "score": score,
+        "statistics": None,
+        "arrays": {
+            "true_data": encode_array(true_data),
+            "user_data": None if user_data is None else encode_array(user_data),
+            "score": score,
+        },
+    }
+    if user_data is not None:
+        result["statistics"] = alignment_statistics(
+            *align_trajectories(true_data, user_data), puzzle.species_list
+        )
+    if data.get("trajectories"):
+        points = int(data.get("points") or DEFAULT_TRAJECTORY_POINTS)
+        # Either plain lists (the default), or compact float32 columns for plotting in the browser.
+        encode = (
+            trajectories_to_columns
+            if data.get("format") == "float32"
+            else trajectories_to_json
+        )
+        result["trajectories"] = {
+            "true": encode(true_data, puzzle.species_list, points),
+            "user": (
+                None
+                if user_data is None
+                else encode(user_data, puzzle.species_list, points)
+            ),
+        }
+    return result
+
+
+def run_batch_job(data: Dict, redis_url: Optional[str] = None) -> Dict:
+    """Like `run_plot_job`, but scoring all the mechanisms of a `/batch` job (see `simulate_batch`)."""
+    return run_job("batch", data, redis_url, batch_job)
+
+
+def batch_job(data: Dict, puzzle: PuzzleEntry) -> Dict:
+    """The body of `run_batch_job`."""
+    return {
+        "status": "success",
+        "temperature": data["temperature"],
+        **simulate_batch(
+            data, puzzle, data["temperature"], plot=data.get("plot", False)
+        ),
+    }
+
+
+def run_sweep_job(data: Dict, redis_url: Optional[str] = None) -> Dict:
+    """Like `run_plot_job`, but simulating one mechanism across all the experiments of a `/sweep` job."""
+    return run_job("sweep", data, redis_url, sweep_job)
+
+
+def sweep_job(data: Dict, puzzle: PuzzleEntry) -> Dict:
+    """The body of `run_sweep_job`."""
+    return {
+        "status": "success",
+        **simulate_sweep(data, puzzle, plot=data.get("plot", True)),
+    }
+
+
+def merge_reports(results: List[Dict]) -> Dict:
+    """Add up the `timings` and `cache_stats` (see `run_job`) of the parts of a job that was split."""
+    timings: Counter = Counter()
+    stats: Dict[str, Counter] = {}
+    for result in results:
+        timings.update(result.get("timings", {}))
+        for namespace, counts in result.get("cache_stats", {}).items():
+            stats.setdefault(namespace, Counter()).update(counts)
+    return {
+        "timings": dict(timings),
+        "cache_stats": {namespace: dict(counts) for namespace, counts in stats.items()},
+    }
+
+
+def combine_batch_jobs(data: Dict, results: List[Dict]) -> Dict:
+    """
+    Combine the results of the parts of a `/batch` job, each with a share of its mechanisms, in order.
+
+    The web process splits large batches so that they run in parallel (see `web.job_queue.JobQueue.submit_all`).
+    Since the parts run at the same time, the job takes as long as the slowest one.
+    """
+    if any(result["status"] != "success" for result in results):
+        return {"status": "error", **merge_reports(results)}
+    combined = [each for result in results for each in result["results"]]
+    seconds = max(result["seconds"] for result in results)
+    return {
+        "status": "success",
+        "temperature": data["temperature"],
+        "results": combined,
+        "seconds": seconds,
+        "mechanisms_per_second": len(combined) / seconds if seconds else None,
+        **merge_reports(results),
+    }
+
+
+def combine_sweep_jobs(data: Dict, results: List[Dict]) -> Dict:
+    """
+    Combine the results of the parts of a `/sweep` job, each with a share of its experiments, in order.
+
+    Like `combine_batch_jobs`. The parts draw no plot, so the summary plot of the whole sweep is drawn here, unless
+    the request has `"plot": false`.
+    """
+    if any(result["status"] != "success" for result in results):
+        return {"status": "error", **merge_reports(results)}
+    with stage_timings() as timings:
+        outcome: Dict = {
+            "status": "success",
+            "results": [each for result in results for each in result["results"]],
+            "seconds": max(result["seconds"] for result in results),
+        }
+        if data.get("plot", True):
+            puzzle = puzzle_registry.get(data["puzzle"])
+            with timed("plotting"):
+                outcome["plot_sweep"] = draw_sweep_plot(
+                    outcome["results"], puzzle.species_list
+                )
+    return {**outcome, **merge_reports(results + [{"timings": timings}])}
+
+
 def simulate_experiments_and_plot(
     data: Dict,
-    puzzle_definition: Dict,
+    puzzle: PuzzleEntry,
     temperature: float,
     diag: bool = False,
 ) -> Tuple[str, str, float]:
     """
     Simulate the puzzle and draw plots.
+
+    To simulate a puzzle that is not in the registry, wrap its definition with `PuzzleEntry.from_definition`.
     """
-    logger = logging.getLogger(data["jobID"]).getChild("simulate_experiments_and_plot")
-    # TODO: Remove this hack add properly fix the "first couple of lines missing" issue.
-    sleep(0.1)
+    true_data, user_data, score = simulate_experiments(data, puzzle, temperature, diag)
+    plot_individual, plot_combined = draw_plots(
+        data["jobID"], puzzle, true_data, user_data
+    )
+    return plot_combined, plot_individual, score
+
+
+def draw_plots(
+    job_id: str,
+    puzzle: PuzzleEntry,
+    true_data: np.ndarray,
+    user_data: Optional[np.ndarray],
+) -> Tuple[str, str]:
+    """Draw the individual and combined plots comparing both models, from at most `PLOT_POINTS` time steps each."""
+    logging.getLogger(job_id).getChild("draw_plots").info("    (5) Drawing plots... ")
+    with timed("plotting"):
+        return plotter.sub_plots(
+            job_id=job_id,
+            plotting_dict=puzzle.definition["coefficient_dict"],
+            true_data=downsample(true_data, PLOT_POINTS),
+            user_data=(
+                None if user_data is None else downsample(user_data, PLOT_POINTS)
+            ),
+        )
+
+
+def simulate_experiments(
+    data: Dict,
+    puzzle: PuzzleEntry,
+    temperature: float,
+    diag: bool = False,
+) -> Tuple[np.ndarray, Optional[np.ndarray], float]:
+    """Simulate both the true model and the user's proposal, and score the latter. Returns both trajectories."""
+    logger = logging.getLogger(data["jobID"]).getChild("simulate_experiments")
     # Now start preparing the instances of custom classes for further actual use in Engine.Driver:
-    #    (1) Instance of the Puzzle class:
-    #           (1.1) general data:
-    elementary_reactions = np.array(puzzle_definition["coefficient_array"], dtype=float)
-    # `coefficient_dict` maps species names to their indices in the coefficient array.
-    species_list = sorted(
-        puzzle_definition["coefficient_dict"],
-        key=puzzle_definition["coefficient_dict"].get,
-    )
-    num_rxn = len(puzzle_definition["coefficient_array"])
-    num_mol = len(species_list)
+    #    (1) General data about the puzzle:
+    species_list = puzzle.species_list
     logger.info(
-        "        %i species are involved. They are: %s", num_mol, " ".join(species_list)
+        "        %i species are involved. They are: %s",
+        len(species_list),
+        " ".join(species_list),
     )
-    #           (1.2) data about the reagents, used in pre-equilibrium computations:
-    #         - - - - - - - - - - - - - - -
-    logger.info("    (0) Pre-equilibration data:")
-    this_puzzle = puzzle_class.puzzle(
-        num_rxn,
-        num_mol,
-        species_list,
-        elementary_reactions,
-        puzzle_definition["energy_dict"],
-        reagent_dictionary=[
-            # Note: We use a list here because we want to keep the order of the reagents as they are defined in the puzzle file.
-            # TODO: Why would it matter? The `.json` files, when loaded into the Python realm as `dict`s, will not be ordered.
-            (
-                reagent,
-                make_reaction_mechanism_for_reagent(
-                    PERsToggles,
-                    data["jobID"],
-                    puzzle_definition,
-                    reagent,
-                    species_list,
-                ),
+    #    (2) Instance of the Condition class:
+    with timed("preparation"):
+        this_condition = make_condition(
+            data["jobID"], species_list, temperature, data["conditions"]
+        )
+        #    (3) Instance of the Solution class, for the species that can ever be present:
+        user_species_list, reactions = prune_proposal(
+            data["jobID"], puzzle, data["reactions"], data["conditions"]
+        )
+        this_solution = make_solution(
+            data["jobID"], puzzle, reactions, user_species_list
+        )
+    # Finally, drive the engine with these data:
+    logger.info("    (4) Simulating...")
+    logger.info("         (a) True Model first:")
+    true_data = get_true_data(
+        data["jobID"], puzzle, temperature, data["conditions"], this_condition, diag
+    )
+    logger.info("         (b) User Model then:")
+    logger.info("             simulating...")
+    user_data = run_user_model(
+        data["jobID"],
+        puzzle,
+        user_species_list,
+        this_solution,
+        temperature,
+        data["conditions"],
+        true_data,
+        diag=diag,
+    )
+    if user_data is None:
+        logger.error("             The model you proposed failed.")
+    score = None
+    if user_data is not None:
+        score = score_user_answer(true_data, user_data)
+    else:
+        score = 0.0
+    return true_data, user_data, score
+
+
+def simulate_batch(
+    data: Dict,
+    puzzle: PuzzleEntry,
+    temperature: float,
+    plot: bool = False,
+) -> Dict:
+    """
+    Score many proposed mechanisms (`data["mechanisms"]`, each a list of reactions) against the same experiment.
+
+    The true model is only simulated once, and so is each distinct mechanism (see `web.mechanisms`). Mechanisms are
+    simulated one after another, within the job's own worker process; the web process splits large batches into
+    parts, which run in parallel (see `combine_batch_jobs`).
+    """
+    logger = logging.getLogger(data["jobID"]).getChild("simulate_batch")
+    start_time = time.perf_counter()
+    this_condition = make_condition(
+        data["jobID"], puzzle.species_list, temperature, data["conditions"]
+    )
+    true_data = get_true_data(
+        data["jobID"], puzzle, temperature, data["conditions"], this_condition
+    )
+    fingerprints = [
+        mechanism_fingerprint(reactions, puzzle.species_list)
+        for reactions in data["mechanisms"]
+    ]
+    distinct: Dict[str, List[List[str]]] = {}
+    for fingerprint, reactions in zip(fingerprints, data["mechanisms"]):
+        distinct.setdefault(fingerprint, reactions)
+    logger.info("%i of these mechanisms are distinct.", len(distinct))
+    outcomes = [
+        evaluate_proposal(
+            data["jobID"],
+            puzzle,
+            temperature,
+            data["conditions"],
+            reactions,
+            true_data,
+            plot,
+        )
+        for reactions in distinct.values()
+    ]
+    outcome_of = dict(zip(distinct, outcomes))
+    results = [dict(outcome_of[fingerprint]) for fingerprint in fingerprints]
+    seconds = time.perf_counter() - start_time
+    logger.info("Evaluated %i mechanisms in %.3g s.", len(data["mechanisms"]), seconds)
+    return {
+        "results": results,
+        "seconds": seconds,
+        "mechanisms_per_second": len(results) / seconds if seconds else None,
+    }
+
+
+def simulate_sweep(
+    data: Dict,
+    puzzle: PuzzleEntry,
+    plot: bool = True,
+) -> Dict:
+    """
+    Simulate and score one proposed mechanism at each point of a sweep (see `web.sweeps.sweep_points`).
+
+    The Puzzle instance is only made once for all points, and so is the Solution instance for all points sharing the
+    same species (see `prune_proposal`); points then only differ by their Condition instances. Points are simulated
+    one after another, within the job's own worker process; the web process splits sweeps into parts, which run in
+    parallel (see `combine_sweep_jobs`). The result lists the score and equilibrium composition
+    of both models at each point and, if `plot`, has one summary plot of them all.
+    """
+    logger = logging.getLogger(data["jobID"]).getChild("simulate_sweep")
+    start_time = time.perf_counter()
+    points = sweep_points(data)
+    logger.info("Sweeping %i experiments.", len(points))
+    solutions: Dict[Tuple[str, ...], solution_class.solution] = {}
+    results = []
+    for point in points:
+        species_list, reactions = prune_proposal(
+            data["jobID"], puzzle, data["reactions"], point["conditions"]
+        )
+        if tuple(species_list) not in solutions:
+            with timed("preparation"):
+                solutions[tuple(species_list)] = make_solution(
+                    data["jobID"], puzzle, reactions, species_list
+                )
+        results.append(
+            evaluate_sweep_point(
+                data["jobID"],
+                puzzle,
+                species_list,
+                solutions[tuple(species_list)],
+                point["temperature"],
+                point["conditions"],
             )
-            for reagent, PERsToggles in puzzle_definition["reagentPERs"].items()
-        ],
-        Ea=puzzle_definition.get("transition_state_energies", None),
+        )
+    outcome: Dict = {"results": results}
+    if plot:
+        with timed("plotting"):
+            outcome["plot_sweep"] = draw_sweep_plot(results, puzzle.species_list)
+    outcome["seconds"] = time.perf_counter() - start_time
+    logger.info("Swept %i experiments in %.3g s.", len(points), outcome["seconds"])
+    return outcome
+
+
+def evaluate_sweep_point(
+    job_id: str,
+    puzzle: PuzzleEntry,
+    species_list: List[str],
+    this_solution: solution_class.solution,
+    temperature: float,
+    conditions: List[Dict],
+) -> Dict:
+    """Simulate both models in one experiment of a sweep, and score the proposed one."""
+    this_condition = make_condition(
+        job_id, puzzle.species_list, temperature, conditions
     )
-    logger.info("    (1) Puzzle Instance successfully created.")
-    #    (2) Instance of the Condition class:
+    true_data = get_true_data(job_id, puzzle, temperature, conditions, this_condition)
+    user_data = run_user_model(
+        job_id, puzzle, species_list, this_solution, temperature, conditions, true_data
+    )
+    return {
+        "temperature": temperature,
+        "score": 0.0 if user_data is None else score_user_answer(true_data, user_data),
+        "true": equilibrium_composition(true_data, puzzle.species_list),
+        "user": equilibrium_composition(user_data, puzzle.species_list),
+    }
+
+
+def evaluate_proposal(
+    job_id: str,
+    puzzle: PuzzleEntry,
+    temperature: float,
+    conditions: List[Dict],
+    reactions: List[List[str]],
+    true_data: np.ndarray,
+    plot: bool = False,
+) -> Dict:
+    """Simulate one proposed mechanism and score it against the true model's trajectory."""
+    start_time = time.perf_counter()
+    species_list, reactions = prune_proposal(job_id, puzzle, reactions, conditions)
+    this_solution = make_solution(job_id, puzzle, reactions, species_list)
+    user_data = run_user_model(
+        job_id, puzzle, species_list, this_solution, temperature, conditions, true_data
+    )
+    result: Dict = {
+        "score": 0.0 if user_data is None else score_user_answer(true_data, user_data)
+    }
+    if plot:
+        result["plot_individual"], result["plot_combined"] = draw_plots(
+            job_id, puzzle, true_data, user_data
+        )
+    result["seconds"] = time.perf_counter() - start_time
+    return result
+
+
+def prune_proposal(
+    job_id: str,
+    puzzle: PuzzleEntry,
+    reactions: List[List[str]],
+    conditions: List[Dict],
+) -> Tuple[List[str], List[List[str]]]:
+    """
+    Leave out the species that can never be present in an experiment, and the proposed reactions that can never run.
+
+    At first, only the reagents are present, along with what their pre-equilibration (the true reactions toggled on
+    for them in `reagentPERs`) can make. From there, the proposed reactions can only make the species found by
+    `web.mechanisms.reachable_species`; the others would stay at 0 throughout, so they are not integrated at all.
+    Returns the species left, in the puzzle's order, and the reactions left.
+    """
+    logger = logging.getLogger(job_id).getChild("prune_proposal")
+    species_list = puzzle.species_list
+    present = set()
+    for reagent in conditions:
+        if reagent["name"] not in species_list:
+            continue
+        toggles = puzzle.definition["reagentPERs"].get(reagent["name"], [])
+        pre_equilibration = [
+            row
+            for row, is_involved in zip(puzzle.coefficient_array, toggles)
+            if is_involved
+        ]
+        present |= reachable_species(
+            pre_equilibration, [species_list.index(reagent["name"])]
+        )
+    coefficient_array = make_coefficient_array(reactions, species_list)
+    present = reachable_species(coefficient_array, present)
+    if len(present) == len(species_list):
+        return species_list, reactions
+    kept_reactions = [
+        reaction
+        for reaction, row in zip(reactions, coefficient_array)
+        if all(i in present for i, c in enumerate(row) if c)
+    ]
+    logger.info(
+        "        Left out %i species that can never be present, and %i reactions that can never run.",
+        len(species_list) - len(present),
+        len(reactions) - len(kept_reactions),
+    )
+    return [s for i, s in enumerate(species_list) if i in present], kept_reactions
+
+
+def run_user_model(
+    job_id: str,
+    puzzle: PuzzleEntry,
+    species_list: List[str],
+    this_solution: solution_class.solution,
+    temperature: float,
+    conditions: List[Dict],
+    true_data: np.ndarray,
+    diag: bool = False,
+) -> Optional[np.ndarray]:
+    """
+    Simulate the proposed model, made by `make_solution` for the species in `species_list` (see `prune_proposal`).
+
+    The trajectory still has a row for every species of the puzzle, those left out staying at 0, so that it can be
+    scored and plotted against the true model's.
+    """
+    this_condition = make_condition(job_id, species_list, temperature, conditions)
+    pruned = len(species_list) < len(puzzle.species_list)
+    rows = [0] + [1 + puzzle.species_list.index(s) for s in species_list]
+    with timed("user_model"):
+        user_data: Optional[np.ndarray] = run_proposed_experiment(
+            job_id,
+            this_condition,
+            this_solution,
+            true_data[rows] if pruned else true_data,
+            diag=diag,
+        )
+    if user_data is None or not pruned:
+        return user_data
+    full_data = np.zeros((len(puzzle.species_list) + 1, user_data.shape[1]))
+    full_data[rows] = user_data
+    return full_data
+
+
+def make_condition(
+    job_id: str, species_list: List[str], temperature: float, conditions: List[Dict]
+) -> condition_class.Condition:
+    """Make the Condition instance describing the starting reactants of an experiment."""
+    logger = logging.getLogger(job_id).getChild("make_condition")
     # rxn_temp = temperature
     # Each entry in data['conditions'] is of the form:
     #     [name of the reactant, amount, its fridge temperature]
-    r_names = [reactant["name"] for reactant in data["conditions"]]
-    r_concs = [reactant["amount"] for reactant in data["conditions"]]
-    r_temps = [reactant["temperature"] for reactant in data["conditions"]]
+    r_names = [reactant["name"] for reactant in conditions]
+    r_concs = [reactant["amount"] for reactant in conditions]
+    r_temps = [reactant["temperature"] for reactant in conditions]
+    num_mol = len(species_list)
     m_concs = [0.0] * num_mol
     logger.info("        %i reactants out of %i species.", len(r_names), num_mol)
     #         - - - - - - - - - - - - - - -
@@ -98,88 +680,138 @@ def simulate_experiments_and_plot(
         temperature, species_list, r_names, r_temps, r_concs, m_concs
     )
     logger.info("    (2) Condition Instance successfully created.")
-    #    (3) Instance of the Solution class:
-    coefficient_array_proposed = []
-    for each_rxn_proposed in data["reactions"]:
-        coefficient_line_proposed = [0] * num_mol
-        for slot_id, each_slot in enumerate(each_rxn_proposed):
-            if each_slot == "":
-                continue
-            if each_slot not in species_list:
-                logger.error(
-                    '            The species "%s" is not in the list of species: %s',
-                    each_slot,
-                    ", ".join(species_list),
-                )
-                continue
-            species_id = species_list.index(each_slot)
-            # Reactants (which sit in the first 2 slots) have a positive coefficient, because they are consumed in the reaction.
-            # Products (which sit in the last 2 slots) have a negative coefficient, because they are produced in the reaction.
-            coefficient_line_proposed[species_id] += 1 if slot_id < 2 else -1
-        coefficient_array_proposed.append(coefficient_line_proposed)
-    # collect the equilibrated concentrations
-    table = tabulate(
-        coefficient_array_proposed,
-        headers=species_list,
-        floatfmt=".4g",
-        tablefmt="github",
+    return this_condition
+
+
+def make_solution(
+    job_id: str,
+    puzzle: PuzzleEntry,
+    reactions: List[List[str]],
+    species_list: Optional[List[str]] = None,
+) -> solution_class.solution:
+    """
+    Make the Solution instance from the reactions the user proposed, for `species_list` (by default, all species).
+
+    The canonical form of the mechanism is simulated (see `web.mechanisms.canonicalize_coefficient_array`), so that
+    all equivalent ways of writing it give the same result, which is cached under the same key.
+    """
+    logger = logging.getLogger(job_id).getChild("make_solution")
+    if species_list is None:
+        species_list = puzzle.species_list
+    num_mol = len(species_list)
+    for each_slot in {slot for reaction in reactions for slot in reaction}:
+        if each_slot != "" and each_slot not in puzzle.species_list:
+            logger.error(
+                '            The species "%s" is not in the list of species: %s',
+                each_slot,
+                ", ".join(puzzle.species_list),
+            )
+    coefficient_array_proposed = canonicalize_coefficient_array(
+        make_coefficient_array(reactions, species_list)
     )
+    if len(coefficient_array_proposed) != len(reactions):
+        logger.info(
+            "        Dropped %i net-zero reactions.",
+            len(reactions) - len(coefficient_array_proposed),
+        )
     num_rxn_proposed = len(coefficient_array_proposed)
-    logger.info(
-        f"        User-proposed {num_rxn_proposed} reactions. They form a coefficient array of:\n%s",
-        table,
-    )
-    table = tabulate(
-        puzzle_definition["coefficient_array"],
-        headers=species_list,
-        floatfmt=".4g",
-        tablefmt="github",
-    )
-    logger.info(
-        "        Compare this array with the true coefficient array:\n%s",
-        table,
-    )
+    logger.info("        User-proposed %i reactions.", num_rxn_proposed)
+    if diagnostics_enabled(job_id):
+        table = tabulate(
+            coefficient_array_proposed,
+            headers=species_list,
+            floatfmt=".4g",
+            tablefmt="github",
+        )
+        logger.info("        They form a coefficient array of:\n%s", table)
+        table = tabulate(
+            puzzle.definition["coefficient_array"],
+            headers=puzzle.species_list,
+            floatfmt=".4g",
+            tablefmt="github",
+        )
+        logger.info(
+            "        Compare this array with the true coefficient array:\n%s",
+            table,
+        )
     #         - - - - - - - - - - - - - - -
     this_solution = solution_class.solution(
         num_rxn_proposed,
         num_mol,
         species_list,
         coefficient_array_proposed,
-        puzzle_definition["energy_dict"],
+        puzzle.definition["energy_dict"],
     )
     logger.info("    (3) Solution Instance successfully created.")
-    # Finally, drive the engine with these data:
-    logger.info("    (4) Simulating...")
+    return this_solution
 
-    logger.info("         (a) True Model first:")
 
-    logger.info("             simulating...")
-    true_data: np.ndarray = run_true_experiment(
-        data["jobID"], this_puzzle, this_condition, diag=diag
+def get_true_data(
+    job_id: str,
+    puzzle: PuzzleEntry,
+    temperature: float,
+    conditions: List[Dict],
+    this_condition: condition_class.Condition,
+    diag: bool = False,
+) -> np.ndarray:
+    """Simulate the true model, unless its trajectory for this experiment is cached already."""
+    logger = logging.getLogger(job_id).getChild("get_true_data")
+    true_data_cache_key = make_true_data_cache_key(
+        puzzle.content_hash, temperature, conditions
     )
-    logger.info("         (b) User Model then:")
-
+    if not diag:
+        with timed("cache_io"):
+            true_data = true_data_cache.get(true_data_cache_key)
+        if true_data is not None:
+            logger.info("             reusing a cached simulation.")
+            return true_data
+    # The Puzzle instance (with the reagents' pre-equilibration mechanisms) is only needed here, so it is only built
+    # on the first cache miss, and then kept on the registry entry for the rest of this process. The driver may
+    # change the instance it is given, so each job simulates a copy of its own.
+    with timed("puzzle_setup"):
+        if puzzle.puzzle is None:
+            puzzle.puzzle = make_puzzle(job_id, puzzle)
+            logger.info("    (1) Puzzle Instance successfully created.")
+        this_puzzle = copy.deepcopy(puzzle.puzzle)
     logger.info("             simulating...")
-    # if we are simulating the true_model then solution argument is none
-    user_data: Optional[np.ndarray] = run_proposed_experiment(
-        data["jobID"], this_condition, this_solution, true_data, diag=diag
-    )
-    if user_data is None:
-        logger.error("             The model you proposed failed.")
+    # The driver pre-equilibrates the reagents (at their temperatures in `this_condition`) before the experiment
+    # itself, so this stage includes pre-equilibration.
+    with timed("true_model"):
+        true_data = run_true_experiment(job_id, this_puzzle, this_condition, diag=diag)
+    if true_data is not None:
+        with timed("cache_io"):
+            true_data_cache.set(true_data_cache_key, true_data)
+    return true_data
+
 
-    logger.info("    (5) Drawing plots... ")
-    (plot_individual, plot_combined) = plotter.sub_plots(
-        job_id=data["jobID"],
-        plotting_dict=puzzle_definition["coefficient_dict"],
-        true_data=true_data,
-        user_data=user_data,
+def make_puzzle(job_id: str, puzzle: PuzzleEntry) -> puzzle_class.puzzle:
+    """Make the Puzzle instance, including the reaction mechanisms used for pre-equilibrating each reagent."""
+    logger = logging.getLogger(job_id).getChild("make_puzzle")
+    puzzle_definition = puzzle.definition
+    logger.info("    (0) Pre-equilibration data:")
+    return puzzle_class.puzzle(
+        len(puzzle.coefficient_array),
+        len(puzzle.species_list),
+        puzzle.species_list,
+        puzzle.coefficient_array,
+        puzzle_definition["energy_dict"],
+        reagent_dictionary=[
+            # Note: We use a list here because we want to keep the order of the reagents as they are defined in the puzzle file.
+            # TODO: Why would it matter? The `.json` files, when loaded into the Python realm as `dict`s, will not be ordered.
+            (
+                reagent,
+                make_reaction_mechanism_for_reagent(
+                    PERsToggles,
+                    job_id,
+                    puzzle_definition,
+                    reagent,
+                    puzzle.species_list,
+                ),
+            )
+            for reagent, PERsToggles in puzzle_definition["reagentPERs"].items()
+        ],
+        Ea=puzzle_definition.get("transition_state_energies", None),
     )
-    score = None
-    if user_data is not None:
-        score = score_user_answer(true_data, user_data)
-    else:
-        score = 0.0
-    return plot_combined, plot_individual, score
 
 
 def make_reaction_mechanism_for_reagent(
@@ -231,13 +863,14 @@ def make_reaction_mechanism_for_reagent(
             if not uninvolved
         ]
         # Print out the pre-equilibration reactions:
-        table = tabulate(
-            pre_equl_elem_rxns,
-            headers=reagent_species_list,
-            floatfmt=".4g",
-            tablefmt="github",
-        )
-        logger.info("            About pre-equilibration:\n%s", table)
+        if diagnostics_enabled(job_id):
+            table = tabulate(
+                pre_equl_elem_rxns,
+                headers=reagent_species_list,
+                floatfmt=".4g",
+                tablefmt="github",
+            )
+            logger.info("            About pre-equilibration:\n%s", table)
     reaction_mechanism = reaction_mechanism_class.reaction_mechanism(
         len(pre_equl_elem_rxns),
         len(reagent_species_list),
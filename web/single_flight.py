@@ -0,0 +1,94 @@
+import logging
+from typing import Dict, Optional
+
+import redis
+
+from web.redis_utils import JOB_LOG_TIMEOUT, job_followers_key, job_log_key
+
+logger = logging.getLogger(__name__)
+
+# Deletes a lock only if it is still held by the given job, so that a job never releases a lock taken over by another.
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Coalesces identical jobs, so that only the first one (the "leader") is computed while the others follow it.
+
+    Leaders are tracked in memory, for the greenlets of this web worker, and (if `redis_url` is given) by a lock in
+    Redis, for all web workers. Followers are added to the Redis set of their leader, so that the leader's log messages
+    are streamed to their channels too (see `web.redis_utils.RedisJobStream`).
+    """
+
+    def __init__(self, redis_url: Optional[str] = None, timeout: int = 600):
+        self.redis = redis.Redis.from_url(redis_url) if redis_url else None
+        # Locks expire after this many seconds, in case their leader never releases them.
+        self.timeout = timeout
+        self._leaders: Dict[str, str] = {}
+
+    def _lock_key(self, key: str) -> str:
+        return f"single_flight:{key}"
+
+    def join(self, key: str, job_id: str) -> Optional[str]:
+        """
+        Make `job_id` the leader of `key` and return None, unless another job leads it already.
+
+        In that case, `job_id` becomes a follower, and the ID of the leader is returned.
+        """
+        leader = self._leaders.get(key)
+        if leader is None and self.redis is not None:
+            leader = self._acquire_shared_lock(key, job_id)
+        if leader is None:
+            self._leaders[key] = job_id
+            return None
+        logger.info("Job %s follows job %s.", job_id, leader)
+        if self.redis is not None:
+            self._follow(leader, job_id)
+        return leader
+
+    def _acquire_shared_lock(self, key: str, job_id: str) -> Optional[str]:
+        """Take the Redis lock of `key` and return None, or return the ID of the job holding it."""
+        try:
+            # The lock may be released between a failed SET and the following GET; then, just try again.
+            for _ in range(3):
+                if self.redis.set(
+                    self._lock_key(key), job_id, nx=True, ex=self.timeout
+                ):
+                    return None
+                leader = self.redis.get(self._lock_key(key))
+                if leader is not None:
+                    return leader.decode()
+        except redis.RedisError as e:
+            logger.warning("Failed taking the lock of %s: %r", key, e)
+        return None
+
+    def _follow(self, leader: str, job_id: str):
+        """Stream the leader's log messages to the follower's channel, starting with those streamed so far."""
+        try:
+            followers_key = job_followers_key(leader)
+            self.redis.sadd(followers_key, job_id)
+            self.redis.expire(followers_key, JOB_LOG_TIMEOUT)
+            # Messages written between these two calls are sent twice, but none are lost.
+            backlog = self.redis.lrange(job_log_key(leader), 0, -1)
+            if backlog:
+                pipeline = self.redis.pipeline(transaction=False)
+                for message in backlog:
+                    pipeline.publish(job_id, message)
+                pipeline.execute()
+        except redis.RedisError as e:
+            logger.warning("Failed following job %s: %r", leader, e)
+
+    def release(self, key: str, job_id: str):
+        """Let the next job asking for `key` lead it again. Call this once the leader's result has been stored."""
+        if self._leaders.get(key) == job_id:
+            del self._leaders[key]
+        if self.redis is not None:
+            try:
+                self.redis.eval(RELEASE_SCRIPT, 1, self._lock_key(key), job_id)
+            except redis.RedisError as e:
+                logger.warning("Failed releasing the lock of %s: %r", key, e)
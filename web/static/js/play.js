@@ -1,4 +1,5 @@
 import { reverseDict, checkBalance, checkOverallBalance } from './shared.js'
+import { renderPlots } from './plot.js'
 /* global $, md5, puzzleName, puzzleData, Sortable, Prism, cheet, EventSource */
 
 let currentViewType = 'info'
@@ -49,6 +50,10 @@ const addElementaryReaction = () => {
   })
 }
 const serverEventListeners = {}
+// How often to ask the server whether a queued job has finished, in milliseconds.
+const resultPollInterval = 1000
+// How many time steps of each trajectory to ask for when plotting in the browser.
+const clientSidePlotPoints = 500
 /** Submit reactions to server and initialize job tracking */
 const plot = function () {
   // Only include checked reactions that are balanced
@@ -100,6 +105,15 @@ const plot = function () {
     solutionID,
     conditionID
   }
+  if ($('#clientSidePlotting').prop('checked')) {
+    // Ask for compact trajectories instead of server-rendered SVGs.
+    Object.assign(parameters, {
+      mode: 'score',
+      trajectories: true,
+      format: 'float32',
+      points: clientSidePlotPoints
+    })
+  }
 
   $('#result_panels').append(`
     <div class="tab-pane" id="${jobID}" role="tabpanel">
@@ -136,33 +150,71 @@ const plot = function () {
     $infoPanel.scrollTop($infoPanel.prop('scrollHeight'))
   }
 
+  const showResult = (data) => {
+    console.log(data)
+    const job = $(`#${data.jobID}`)
+    job.find('.card-footer').html(`Completed at <code>${Date()}</code>`)
+    if (data.trajectories) {
+      const plots = renderPlots(data.trajectories)
+      job.find('.view_individual').append(plots.individual)
+      job.find('.view_combined').append(plots.combined)
+    } else {
+      job.find('.view_individual').append(data.plot_individual)
+      job.find('.view_combined').append(data.plot_combined)
+    }
+    const scoreText =
+      typeof data.score === 'number'
+        ? `Score: ${data.score.toFixed(1)}%`
+        : 'No Score'
+    $(`#${data.jobID}_nav`).text(scoreText)
+    serverEventListeners[data.jobID].close()
+    currentViewType = 'combined'
+    $('#button_to_view_combined').click()
+    updateAllTabViews()
+    Prism.highlightElement(job.find('.view_info').get(0))
+    $btn.prop('disabled', false).text('Plot')
+  }
+
+  const onError = (xhr) => {
+    if (xhr.status === 503 && xhr.responseJSON) {
+      $(`#${jobID} .card-footer`).text(xhr.responseJSON.message)
+      $(`#${jobID}_nav`).text('Busy')
+      serverEventListeners[jobID].close()
+    }
+    $btn.prop('disabled', false).text('Plot')
+  }
+
+  /** Poll for the result of a queued job until it has finished */
+  const pollResult = () => {
+    $.ajax({
+      url: `/result/${jobID}`,
+      type: 'GET',
+      dataType: 'json',
+      success: (data, textStatus, xhr) => {
+        if (xhr.status === 202) {
+          setTimeout(pollResult, resultPollInterval)
+        } else {
+          showResult(data)
+        }
+      },
+      error: onError
+    })
+  }
+
   $.ajax({
     url: '/plot',
     type: 'POST',
     contentType: 'application/json',
-    data: JSON.stringify(parameters),
+    data: JSON.stringify({ ...parameters, async: true }),
     dataType: 'json',
-    success: (data) => {
-      console.log(data)
-      const job = $(`#${data.jobID}`)
-      job.find('.card-footer').html(`Completed at <code>${Date()}</code>`)
-      job.find('.view_individual').append(data.plot_individual)
-      job.find('.view_combined').append(data.plot_combined)
-      const scoreText =
-        typeof data.score === 'number'
-          ? `Score: ${data.score.toFixed(1)}%`
-          : 'No Score'
-      $(`#${data.jobID}_nav`).text(scoreText)
-      serverEventListeners[data.jobID].close()
-      currentViewType = 'combined'
-      $('#button_to_view_combined').click()
-      updateAllTabViews()
-      Prism.highlightElement(job.find('.view_info').get(0))
-      $btn.prop('disabled', false).text('Plot')
+    success: (data, textStatus, xhr) => {
+      if (xhr.status === 202) {
+        setTimeout(pollResult, resultPollInterval)
+      } else {
+        showResult(data)
+      }
     },
-    error: () => {
-      $btn.prop('disabled', false).text('Plot')
-    }
+    error: onError
   })
 }
 
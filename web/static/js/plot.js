@@ -0,0 +1,101 @@
+// plot.js: Draw job results in the browser, from the compact trajectories sent by the server.
+/* global atob */
+
+const width = 640
+const height = 320
+const margin = { top: 20, right: 120, bottom: 40, left: 60 }
+const colors = [
+  '#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
+  '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf'
+]
+
+/**
+ * Decode a base64 string of little-endian float32 values.
+ * @param {string} b64
+ * @returns {Float32Array}
+ */
+function decodeFloat32 (b64) {
+  const bytes = Uint8Array.from(atob(b64), (c) => c.charCodeAt(0))
+  return new Float32Array(bytes.buffer)
+}
+
+/**
+ * Decode one trajectory, as encoded by `web.trajectories.trajectories_to_columns`.
+ * @param {Object} columns
+ * @returns {{time: Float32Array, curves: Object<string, Float32Array>}}
+ */
+function decodeTrajectory (columns) {
+  const concentrations = decodeFloat32(columns.concentrations)
+  const curves = {}
+  columns.species.forEach((species, i) => {
+    curves[species] = concentrations.subarray(i * columns.length, (i + 1) * columns.length)
+  })
+  return { time: decodeFloat32(columns.time), curves }
+}
+
+/**
+ * The largest value of some arrays, or 0. Unlike `Math.max(...values)`, this works for arrays of any length.
+ * @param {Array<Float32Array>} arrays
+ * @returns {number}
+ */
+function maxOf (arrays) {
+  return arrays.reduce((max, values) => values.reduce((m, value) => (value > m ? value : m), max), 0)
+}
+
+/**
+ * Draw an SVG line chart.
+ * @param {Array<{time: Float32Array, values: Float32Array, color: string, dashed: boolean, label: string}>} lines
+ * @returns {string}
+ */
+function lineChart (lines) {
+  const xMax = maxOf(lines.map((line) => line.time)) || 1
+  const yMax = maxOf(lines.map((line) => line.values)) || 1
+  const plotWidth = width - margin.left - margin.right
+  const plotHeight = height - margin.top - margin.bottom
+  const x = (value) => margin.left + (value / xMax) * plotWidth
+  const y = (value) => margin.top + plotHeight - (value / yMax) * plotHeight
+  const paths = lines.map((line, i) => {
+    const points = Array.from(line.time, (t, j) => `${x(t).toFixed(1)},${y(line.values[j]).toFixed(1)}`)
+    const dash = line.dashed ? ' stroke-dasharray="6 4"' : ''
+    const legendY = margin.top + 16 * i
+    return `
+      <polyline points="${points.join(' ')}" fill="none" stroke="${line.color}" stroke-width="1.5"${dash}/>
+      <line x1="${width - margin.right + 10}" y1="${legendY}" x2="${width - margin.right + 30}" y2="${legendY}" stroke="${line.color}"${dash}/>
+      <text x="${width - margin.right + 34}" y="${legendY + 4}" font-size="11">${line.label}</text>`
+  })
+  return `
+    <svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 ${width} ${height}" width="100%">
+      <line x1="${margin.left}" y1="${y(0)}" x2="${x(xMax)}" y2="${y(0)}" stroke="black"/>
+      <line x1="${margin.left}" y1="${y(0)}" x2="${margin.left}" y2="${y(yMax)}" stroke="black"/>
+      <text x="${margin.left}" y="${y(0) + 16}" font-size="11" text-anchor="middle">0</text>
+      <text x="${x(xMax)}" y="${y(0) + 16}" font-size="11" text-anchor="middle">${xMax.toPrecision(3)}</text>
+      <text x="${margin.left + (x(xMax) - margin.left) / 2}" y="${height - 6}" font-size="12" text-anchor="middle">Time</text>
+      <text x="${margin.left - 6}" y="${y(yMax) + 4}" font-size="11" text-anchor="end">${yMax.toPrecision(3)}</text>
+      <text x="${margin.left - 6}" y="${y(0) + 4}" font-size="11" text-anchor="end">0</text>
+      <text transform="translate(14 ${margin.top + plotHeight / 2}) rotate(-90)" font-size="12" text-anchor="middle">Concentration</text>
+      ${paths.join('')}
+    </svg>`
+}
+
+/**
+ * Draw the individual and combined figures of a job, like the server would.
+ * The true model is drawn in solid curves, and the user's model in dashed curves.
+ * @param {{true: Object, user: ?Object}} trajectories
+ * @returns {{individual: string, combined: string}}
+ */
+export function renderPlots (trajectories) {
+  const trueModel = decodeTrajectory(trajectories.true)
+  const userModel = trajectories.user ? decodeTrajectory(trajectories.user) : null
+  const linesPerSpecies = trajectories.true.species.map((species, i) => {
+    const color = colors[i % colors.length]
+    const lines = [{ time: trueModel.time, values: trueModel.curves[species], color, dashed: false, label: species }]
+    if (userModel) {
+      lines.push({ time: userModel.time, values: userModel.curves[species], color, dashed: true, label: `${species} (yours)` })
+    }
+    return lines
+  })
+  return {
+    individual: linesPerSpecies.map(lineChart).join(''),
+    combined: lineChart(linesPerSpecies.flat())
+  }
+}
@@ -0,0 +1,80 @@
+import io
+from typing import Dict, List, Optional
+
+import numpy as np
+from matplotlib.figure import Figure
+
+
+def sweep_points(data: Dict) -> List[Dict]:
+    """
+    The experiments of a `/sweep` request, each with its own `temperature` and `conditions`.
+
+    Each entry of `data["sweep"]` may set either or both; the rest is taken from the request itself, so that a
+    temperature sweep only lists temperatures.
+    """
+    return [
+        {
+            "temperature": point.get("temperature", data.get("temperature")),
+            "conditions": point.get("conditions", data.get("conditions")),
+        }
+        for point in data["sweep"]
+    ]
+
+
+def equilibrium_composition(
+    data: Optional[np.ndarray], species_list: List[str]
+) -> Optional[Dict[str, float]]:
+    """The amount of each species at the last time step of a trajectory, taken as its equilibrium."""
+    if data is None:
+        return None
+    return {
+        species: float(amount) for species, amount in zip(species_list, data[1:, -1])
+    }
+
+
+def draw_sweep_plot(results: List[Dict], species_list: List[str]) -> str:
+    """
+    Draw the score and the equilibrium compositions of both models across the points of a sweep, as an SVG.
+
+    Points are placed by temperature if they all have a different one, and in order otherwise. The true model is
+    drawn with solid lines, and the proposed one with dashed lines.
+    """
+    temperatures = [result["temperature"] for result in results]
+    by_temperature = len(set(temperatures)) == len(temperatures)
+    if by_temperature:
+        order = np.argsort(temperatures)
+        x = np.array(temperatures, dtype=float)[order]
+    else:
+        order = np.arange(len(results))
+        x = order + 1
+    ordered = [results[i] for i in order]
+    # Not through pyplot, which keeps every figure in global state until closed.
+    figure = Figure(figsize=(8, 7))
+    composition_axes, score_axes = figure.subplots(
+        2, 1, sharex=True, gridspec_kw={"height_ratios": [3, 1]}
+    )
+    for i, species in enumerate(species_list):
+        color = f"C{i % 10}"
+        for model, linestyle in (("true", "-"), ("user", "--")):
+            amounts = [
+                np.nan if result[model] is None else result[model][species]
+                for result in ordered
+            ]
+            composition_axes.plot(
+                x,
+                amounts,
+                linestyle=linestyle,
+                marker="o",
+                color=color,
+                label=species if model == "true" else None,
+            )
+    composition_axes.set_ylabel("Amount at equilibrium")
+    composition_axes.legend(loc="best", fontsize="small")
+    score_axes.plot(x, [result["score"] for result in ordered], marker="o")
+    score_axes.set_ylabel("Score")
+    score_axes.set_ylim(0, 100)
+    score_axes.set_xlabel("Temperature (K)" if by_temperature else "Experiment")
+    figure.tight_layout()
+    svg = io.StringIO()
+    figure.savefig(svg, format="svg")
+    return svg.getvalue()
@@ -0,0 +1,141 @@
+import base64
+from typing import Dict, List
+
+import numpy as np
+
+# Trajectory arrays, as returned by the engine, have time as their first row, and one row per species after that.
+
+
+def _normalize_rows(data: np.ndarray) -> np.ndarray:
+    """Scale each row into [0, 1], so that every row weighs the same when comparing shapes."""
+    low = data.min(axis=1, keepdims=True)
+    span = data.max(axis=1, keepdims=True) - low
+    return (data - low) / np.where(span > 0, span, 1.0)
+
+
+def lttb_indices(data: np.ndarray, points: int) -> np.ndarray:
+    """
+    Choose which `points` time steps best preserve the shape of all curves, by "Largest-Triangle-Three-Buckets".
+
+    The time steps between the first and the last one are split into `points - 2` buckets. From each bucket, we keep
+    the time step that forms the largest triangle with the one kept from the previous bucket and the average of the
+    next bucket, summing the areas over all species. Spikes and bends are thus kept, while flat stretches are thinned.
+    """
+    num_steps = data.shape[1]
+    if points >= num_steps:
+        return np.arange(num_steps)
+    points = max(points, 3)
+    normalized = _normalize_rows(data)
+    time, curves = normalized[0], normalized[1:]
+    edges = np.linspace(1, num_steps - 1, points - 1).astype(int)
+    indices = [0]
+    for bucket in range(points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_slice = slice(edges[bucket + 1], edges[bucket + 2])
+        else:
+            next_slice = slice(num_steps - 1, num_steps)
+        next_time = time[next_slice].mean()
+        next_curves = curves[:, next_slice].mean(axis=1, keepdims=True)
+        a = indices[-1]
+        # Twice the area of each triangle, per species; the constant factor doesn't change which one is largest.
+        areas = np.abs(
+            (time[a] - next_time) * (curves[:, start:stop] - curves[:, [a]])
+            - (time[a] - time[start:stop]) * (next_curves - curves[:, [a]])
+        ).sum(axis=0)
+        indices.append(start + int(areas.argmax()))
+    indices.append(num_steps - 1)
+    return np.array(indices)
+
+
+def downsample(data: np.ndarray, points: int) -> np.ndarray:
+    """Keep (at most) `points` time steps of a trajectory array, chosen to preserve the shape of its curves."""
+    if points >= data.shape[1]:
+        return data
+    return data[:, lttb_indices(data, points)]
+
+
+def simplify_indices(data: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Choose the fewest time steps that still describe all curves within `tolerance`, by "Ramer-Douglas-Peucker".
+
+    Between two kept time steps, each curve is approximated by a straight line; the time step that deviates the most
+    from these lines is kept too, until no curve deviates by more than `tolerance` times its range. Unlike
+    `lttb_indices`, the number of time steps kept depends on how complex the curves are, not on a fixed budget.
+    """
+    num_steps = data.shape[1]
+    if num_steps <= 2 or tolerance <= 0:
+        return np.arange(num_steps)
+    time, curves = data[0], _normalize_rows(data[1:])
+    keep = np.zeros(num_steps, dtype=bool)
+    keep[[0, -1]] = True
+    # Not recursive, so that long trajectories cannot exhaust the stack.
+    segments = [(0, num_steps - 1)]
+    while segments:
+        start, stop = segments.pop()
+        if stop - start < 2:
+            continue
+        span = time[stop] - time[start]
+        fraction = (time[start + 1 : stop] - time[start]) / (span if span else 1.0)
+        interpolated = curves[:, [start]] + np.outer(
+            curves[:, stop] - curves[:, start], fraction
+        )
+        errors = np.abs(curves[:, start + 1 : stop] - interpolated).max(axis=0)
+        worst = int(errors.argmax())
+        if errors[worst] > tolerance:
+            split = start + 1 + worst
+            keep[split] = True
+            segments += [(start, split), (split, stop)]
+    return np.flatnonzero(keep)
+
+
+def simplify(data: np.ndarray, tolerance: float) -> np.ndarray:
+    """Drop the time steps of a trajectory array that linear interpolation recovers within `tolerance`."""
+    indices = simplify_indices(data, tolerance)
+    if len(indices) == data.shape[1]:
+        return data
+    return data[:, indices]
+
+
+def trajectories_to_json(
+    data: np.ndarray, species_list: List[str], points: int
+) -> Dict:
+    """Represent a (downsampled) trajectory array as plain lists, keyed by species name."""
+    data = downsample(data, points)
+    return {
+        "time": data[0].tolist(),
+        "concentrations": {
+            species: row.tolist() for species, row in zip(species_list, data[1:])
+        },
+    }
+
+
+def trajectories_to_columns(
+    data: np.ndarray, species_list: List[str], points: int
+) -> Dict:
+    """
+    Represent a (downsampled) trajectory array compactly, for plotting in the browser.
+
+    Times and concentrations are sent as base64-encoded little-endian float32 arrays; `concentrations` holds one
+    row of `length` values per species, in the order of `species`.
+    """
+    data = downsample(data, points).astype("<f4")
+    return {
+        "species": species_list,
+        "length": data.shape[1],
+        "time": base64.b64encode(data[0].tobytes()).decode("ascii"),
+        "concentrations": base64.b64encode(data[1:].tobytes()).decode("ascii"),
+    }
+
+
+def alignment_statistics(
+    true_aligned: np.ndarray, user_aligned: np.ndarray, species_list: List[str]
+) -> Dict:
+    """Summarize how far the user's trajectories are from the true ones, once both are aligned on the same times."""
+    diff = np.abs(true_aligned[1:] - user_aligned[1:])
+    denom = np.abs(true_aligned[1:]).sum()
+    return {
+        "max_abs_error": dict(zip(species_list, diff.max(axis=1).tolist())),
+        "mean_abs_error": dict(zip(species_list, diff.mean(axis=1).tolist())),
+        "relative_error": float(diff.sum() / denom) if denom else None,
+    }